@@ -1,53 +1,295 @@
-from fastapi import FastAPI, HTTPException
-from fastapi.responses import FileResponse
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import FileResponse, Response
+from collections import OrderedDict
+from email.utils import formatdate
+from urllib.parse import quote
+import anyio.to_thread
+import json
 import os
 from pathlib import Path
 
 app = FastAPI(title="File Server", description="Download files by hash code")
 
+ZEROCOPY_EXTENSION = "http.response.zerocopysend"
+
+# Constant bodies for the informational endpoints, serialized once at import
+ROOT_BODY = json.dumps({
+    "message": "File Server API",
+    "usage": "GET /download/{hash_code} to download a file"
+}).encode()
+HEALTH_BODY = json.dumps({"status": "healthy"}).encode()
+
 # Directory where files are stored (can be overridden by environment variable)
 FILES_DIR = os.getenv("FILES_DIR", "/app/files")
 
+# When set (e.g. "/internal-files/"), large downloads are handed to the
+# fronting nginx with X-Accel-Redirect instead of being streamed by this process
+ACCEL_REDIRECT_PREFIX = os.getenv("ACCEL_REDIRECT_PREFIX")
+
+# Files up to this size are kept in memory (LRU) after the first download
+SMALL_FILE_MAX_SIZE = 64 * 1024
+SMALL_FILE_CACHE_ENTRIES = 256
+_small_file_cache = OrderedDict()  # hash code -> (etag, bytes)
+
+# In-memory index: hash code -> file name, built from a single directory scan
+HASH_INDEX = {}
+_index_mtime = None
+
+
+def build_hash_index():
+    """
+    Scan FILES_DIR once and map each hash code (name before the first dot)
+    to its file name. Rebuilt only when the directory mtime changes.
+    """
+    global HASH_INDEX, _index_mtime
+
+    index = {}
+    try:
+        mtime = os.stat(FILES_DIR).st_mtime_ns
+        with os.scandir(FILES_DIR) as it:
+            for entry in it:
+                stem, dot, _ = entry.name.partition(".")
+                if dot and entry.is_file():
+                    index.setdefault(stem, entry.name)
+    except FileNotFoundError:
+        mtime = None
+
+    HASH_INDEX = index
+    _index_mtime = mtime
+
+
+def lookup_hash(hash_code: str):
+    """
+    Resolve a hash code to a file name, refreshing the index if the
+    directory changed since it was last built.
+    """
+    name = HASH_INDEX.get(hash_code)
+    if name is not None:
+        return name
+
+    try:
+        mtime = os.stat(FILES_DIR).st_mtime_ns
+    except FileNotFoundError:
+        mtime = None
+    if mtime != _index_mtime:
+        build_hash_index()
+        name = HASH_INDEX.get(hash_code)
+    return name
+
+
+class ZeroCopyFileResponse(FileResponse):
+    """
+    FileResponse that hands the open file to the server through the ASGI
+    zerocopysend extension (kernel sendfile) when the server advertises it,
+    and falls back to a chunked read loop otherwise.
+
+    byte_range: optional inclusive (start, end) pair to send only part of the file.
+    """
+
+    def __init__(self, *args, byte_range=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.byte_range = byte_range
+
+    async def __call__(self, scope, receive, send):
+        zerocopy = ZEROCOPY_EXTENSION in scope.get("extensions", {}) and scope.get("method") != "HEAD"
+        if self.byte_range is None and not zerocopy:
+            await super().__call__(scope, receive, send)
+            return
+
+        if self.stat_result is None:
+            self.stat_result = os.stat(self.path)
+            self.set_stat_headers(self.stat_result)
+
+        if self.byte_range is None:
+            offset, count = 0, self.stat_result.st_size
+        else:
+            offset, count = self.byte_range[0], self.byte_range[1] - self.byte_range[0] + 1
+
+        with open(self.path, "rb") as f:
+            await send({
+                "type": "http.response.start",
+                "status": self.status_code,
+                "headers": self.raw_headers,
+            })
+            if scope.get("method") == "HEAD":
+                await send({"type": "http.response.body", "body": b"", "more_body": False})
+            elif zerocopy:
+                await send({
+                    "type": ZEROCOPY_EXTENSION,
+                    "file": f,
+                    "offset": offset,
+                    "count": count,
+                    "more_body": False,
+                })
+            else:
+                f.seek(offset)
+                remaining = count
+                while remaining > 0:
+                    chunk = await anyio.to_thread.run_sync(f.read, min(self.chunk_size, remaining))
+                    if not chunk:
+                        break
+                    remaining -= len(chunk)
+                    await send({"type": "http.response.body", "body": chunk, "more_body": True})
+                await send({"type": "http.response.body", "body": b"", "more_body": False})
+
+        if self.background is not None:
+            await self.background()
+
+
+def parse_range(range_header: str, size: int):
+    """
+    Parse a single "bytes=start-end" Range header into an inclusive (start, end) pair.
+
+    Returns None when the header must be ignored (other unit, multiple ranges,
+    malformed) and raises 416 when the range cannot be satisfied.
+    """
+    unit, _, spec = range_header.partition("=")
+    if unit.strip().lower() != "bytes" or "," in spec:
+        return None
+
+    start_s, dash, end_s = spec.strip().partition("-")
+    if not dash:
+        return None
+
+    try:
+        if start_s:
+            start = int(start_s)
+            end = int(end_s) if end_s else size - 1
+            if end < start:
+                return None
+            end = min(end, size - 1)
+        else:
+            # Suffix range: the last N bytes
+            suffix = int(end_s)
+            start, end = max(size - suffix, 0), size - 1
+            if suffix <= 0:
+                start = size
+    except ValueError:
+        return None
+
+    if start > end or start >= size:
+        raise HTTPException(
+            status_code=416,
+            detail="Requested range not satisfiable",
+            headers={"Content-Range": f"bytes */{size}"}
+        )
+    return start, end
+
+
+def file_etag(st: os.stat_result) -> str:
+    """Validator derived from inode, mtime and size; changes whenever the file does."""
+    return f'W/"{st.st_ino:x}-{int(st.st_mtime):x}-{st.st_size:x}"'
+
+
+def read_small_file(hash_code: str, path: Path, etag: str) -> bytes:
+    """Return the content of a small file, served from the LRU when still valid."""
+    cached = _small_file_cache.get(hash_code)
+    if cached is not None and cached[0] == etag:
+        _small_file_cache.move_to_end(hash_code)
+        return cached[1]
+
+    content = path.read_bytes()
+    _small_file_cache[hash_code] = (etag, content)
+    _small_file_cache.move_to_end(hash_code)
+    if len(_small_file_cache) > SMALL_FILE_CACHE_ENTRIES:
+        _small_file_cache.popitem(last=False)
+    return content
+
+
+@app.on_event("startup")
+async def startup():
+    build_hash_index()
+
 
 @app.get("/")
 async def root():
-    return {
-        "message": "File Server API",
-        "usage": "GET /download/{hash_code} to download a file"
-    }
+    return Response(content=ROOT_BODY, media_type="application/json")
 
 
 @app.get("/health")
 async def health_check():
-    return {"status": "healthy"}
+    return Response(content=HEALTH_BODY, media_type="application/json")
 
 
 @app.get("/download/{hash_code}")
-async def download_file(hash_code: str):
+async def download_file(hash_code: str, request: Request):
     """
     Download a file by its hash code (extension auto-detected).
+
+    Supports conditional requests (a matching If-None-Match returns 304)
+    and single byte ranges (Range: bytes=start-end returns 206).
     """
 
     # Sanitize
     hash_code = os.path.basename(hash_code)
 
-    # Look for any file with this hash + any extension
-    files_path = Path(FILES_DIR)
-    matching_files = list(files_path.glob(f"{hash_code}.*"))
+    # Look up the file with this hash in the index (extension auto-detected)
+    name = lookup_hash(hash_code)
 
-    if not matching_files:
+    if name is None:
         raise HTTPException(
             status_code=404,
             detail=f"No file found for hash '{hash_code}' (looked for {hash_code}.*)"
         )
 
-    # If multiple results, choose the first one
-    file_path = matching_files[0]
+    file_path = Path(FILES_DIR) / name
+
+    try:
+        st = os.stat(file_path)
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail=f"No file found for hash '{hash_code}'")
+
+    etag = file_etag(st)
+    headers = {
+        "ETag": etag,
+        "Last-Modified": formatdate(st.st_mtime, usegmt=True),
+        "Accept-Ranges": "bytes",
+    }
+
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers=headers)
+
+    # Let nginx transfer large files itself (sendfile, Range and caching included)
+    if ACCEL_REDIRECT_PREFIX and st.st_size > SMALL_FILE_MAX_SIZE:
+        return Response(
+            media_type="application/octet-stream",
+            headers={
+                "X-Accel-Redirect": f"{ACCEL_REDIRECT_PREFIX.rstrip('/')}/{quote(file_path.name)}",
+                "Content-Disposition": f'attachment; filename="{file_path.name}"',
+            }
+        )
+
+    byte_range = None
+    status_code = 200
+    range_header = request.headers.get("range")
+    if range_header:
+        byte_range = parse_range(range_header, st.st_size)
+    if byte_range is not None:
+        start, end = byte_range
+        status_code = 206
+        headers["Content-Range"] = f"bytes {start}-{end}/{st.st_size}"
+        headers["Content-Length"] = str(end - start + 1)
+
+    if st.st_size <= SMALL_FILE_MAX_SIZE:
+        content = read_small_file(hash_code, file_path, etag)
+        if byte_range is not None:
+            content = content[start:end + 1]
+        headers["Content-Disposition"] = f'attachment; filename="{file_path.name}"'
+        return Response(
+            content=content,
+            status_code=status_code,
+            media_type="application/octet-stream",
+            headers=headers
+        )
 
-    return FileResponse(
+    return ZeroCopyFileResponse(
         path=str(file_path),
+        status_code=status_code,
         filename=file_path.name,
-        media_type="application/octet-stream"
+        media_type="application/octet-stream",
+        headers=headers,
+        stat_result=st,
+        byte_range=byte_range
     )
 
 
@@ -60,11 +302,11 @@ async def list_files():
         List of file hashes (filenames)
     """
     try:
-        files_path = Path(FILES_DIR)
-        if not files_path.exists():
+        if not os.path.isdir(FILES_DIR):
             return {"files": [], "message": "Files directory does not exist"}
 
-        files = [f.name for f in files_path.iterdir() if f.is_file()]
+        with os.scandir(FILES_DIR) as it:
+            files = [entry.name for entry in it if entry.is_file(follow_symlinks=False)]
         return {
             "files": files,
             "count": len(files),
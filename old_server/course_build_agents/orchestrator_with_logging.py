@@ -13,24 +13,31 @@ class StreamingPrintCapture:
     """Captures print statements in a buffer for later retrieval."""
     def __init__(self):
         self.original_stdout = sys.stdout
-        self.buffer = []
+        self.buffer = StringIO()
 
     def write(self, text):
         # Write to original stdout
         self.original_stdout.write(text)
         # Capture in buffer
-        self.buffer.append(text)
+        self.buffer.write(text)
 
     def flush(self):
         self.original_stdout.flush()
 
     def get_and_clear(self):
         """Get captured content and clear buffer."""
-        content = ''.join(self.buffer)
-        self.buffer = []
+        content = self.buffer.getvalue()
+        self.buffer.seek(0)
+        self.buffer.truncate(0)
         return content
 
 
+def _drain(capture):
+    """Yield the captured output as a progress update, if there is any."""
+    if capture.buffer.tell():
+        yield {'type': 'progress', 'content': capture.get_and_clear()}
+
+
 def stream_course_generation_progress(subject, config=None):
     """
     Stream course generation with progress updates.
@@ -67,34 +74,26 @@ def stream_course_generation_progress(subject, config=None):
         print("=" * 80)
 
         # Yield header
-        header = capture.get_and_clear()
-        if header:
-            yield {'type': 'progress', 'content': header}
+        yield from _drain(capture)
 
         knowledge_base, sources = retriever.retrieve_knowledge(subject)
 
         # Yield retrieval logs
-        retrieval_logs = capture.get_and_clear()
-        if retrieval_logs:
-            yield {'type': 'progress', 'content': retrieval_logs}
+        yield from _drain(capture)
 
         # Phase 2: Knowledge Enhancement
         print("\n" + "=" * 80)
         print("PHASE 2: AMÉLIORATION DES CONNAISSANCES")
         print("=" * 80)
 
-        phase2_header = capture.get_and_clear()
-        if phase2_header:
-            yield {'type': 'progress', 'content': phase2_header}
+        yield from _drain(capture)
 
         enhanced_knowledge, all_sources = enhancer.enhance_knowledge(
             subject, knowledge_base, sources
         )
 
         # Yield enhancement logs
-        enhancement_logs = capture.get_and_clear()
-        if enhancement_logs:
-            yield {'type': 'progress', 'content': enhancement_logs}
+        yield from _drain(capture)
 
         sources_added = len(all_sources) - len(sources)
 
@@ -103,18 +102,14 @@ def stream_course_generation_progress(subject, config=None):
         print("PHASE 3: GÉNÉRATION DE LA STRUCTURE DU COURS")
         print("=" * 80)
 
-        phase3_header = capture.get_and_clear()
-        if phase3_header:
-            yield {'type': 'progress', 'content': phase3_header}
+        yield from _drain(capture)
 
         course_structure = course_generator.generate_course(
             subject, enhanced_knowledge, all_sources
         )
 
         # Yield course generation logs
-        generation_logs = capture.get_and_clear()
-        if generation_logs:
-            yield {'type': 'progress', 'content': generation_logs}
+        yield from _drain(capture)
 
         # Generate markdown
         print("\n" + "=" * 80)
@@ -122,9 +117,7 @@ def stream_course_generation_progress(subject, config=None):
         print("=" * 80)
         print(f"   Génération du contenu markdown...")
 
-        markdown_header = capture.get_and_clear()
-        if markdown_header:
-            yield {'type': 'progress', 'content': markdown_header}
+        yield from _drain(capture)
 
         course_markdown = course_generator.get_markdown_content()
 
@@ -135,9 +128,7 @@ def stream_course_generation_progress(subject, config=None):
         print(f"Sources: {len(all_sources)} (dont {sources_added} ajoutées)")
         print("=" * 80)
 
-        final_logs = capture.get_and_clear()
-        if final_logs:
-            yield {'type': 'progress', 'content': final_logs}
+        yield from _drain(capture)
 
         # Return final results
         results = {
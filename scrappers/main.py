@@ -1,3 +1,4 @@
+import asyncio
 from scraper_category import scrape_category_pages
 from scraper_article import scrape_article
 from models import AgnoDocument
@@ -5,7 +6,7 @@ from models import AgnoDocument
 def main():
     documents = []
 
-    article_urls = scrape_category_pages()
+    article_urls = asyncio.run(scrape_category_pages())
     print(f"\n[INFO] {len(article_urls)} articles trouvés\n")
 
     for url in article_urls:
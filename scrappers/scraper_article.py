@@ -1,12 +1,26 @@
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from bs4 import BeautifulSoup
 from config import HEADERS
 from utils import clean_text
 
+# une seule session pour tous les articles : connexions keep-alive réutilisées
+# (pas de handshake TLS par article) + retry sur les erreurs serveur
+_SESSION = requests.Session()
+_SESSION.headers.update(HEADERS)
+_adapter = HTTPAdapter(
+    pool_connections=1,
+    pool_maxsize=8,
+    max_retries=Retry(total=3, backoff_factor=0.3, status_forcelist=[500, 502, 503, 504]),
+)
+_SESSION.mount("https://", _adapter)
+_SESSION.mount("http://", _adapter)
+
 def scrape_article(article_url: str) -> dict:
     print(f"[ARTICLE] {article_url}")
 
-    r = requests.get(article_url, headers=HEADERS, timeout=10)
+    r = _SESSION.get(article_url, timeout=10)
     r.raise_for_status()
 
     soup = BeautifulSoup(r.text, "lxml")
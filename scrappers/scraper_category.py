@@ -1,32 +1,83 @@
-import requests
-from bs4 import BeautifulSoup
+import asyncio
+import httpx
 from config import CATEGORY_URL, TOTAL_PAGES, HEADERS
 
+try:
+    from selectolax.lexbor import LexborHTMLParser
+except ImportError:  # fallback: BeautifulSoup + lxml
+    LexborHTMLParser = None
+    from bs4 import BeautifulSoup
+
+# connexions HTTP simultanées (et requêtes en vol) vers le site
+MAX_CONNECTIONS = 16
+
 def get_category_page_url(page: int) -> str:
     if page == 1:
         return CATEGORY_URL
     return f"{CATEGORY_URL}/page/{page}/"
 
-def scrape_category_pages() -> list[str]:
-    article_urls = set()
+def extract_article_urls(html: str) -> list[str]:
+    # premier lien du premier h2 de chaque article
+    urls = []
+
+    if LexborHTMLParser is not None:
+        tree = LexborHTMLParser(html)
+        for article in tree.css("article"):
+            h2 = article.css_first("h2")
+            link = h2.css_first("a[href]") if h2 else None
+            if link:
+                urls.append(link.attributes["href"])
+        return urls
+
+    soup = BeautifulSoup(html, "lxml")
+    for article in soup.find_all("article"):
+        h2 = article.find("h2")
+        if not h2:
+            continue
+
+        link = h2.find("a", href=True)
+        if link:
+            urls.append(link["href"])
+    return urls
 
-    for page in range(1, TOTAL_PAGES + 1):
-        url = get_category_page_url(page)
+async def _scrape_page(client: httpx.AsyncClient, limiter: asyncio.Semaphore, page: int) -> list[str]:
+    url = get_category_page_url(page)
+
+    # pas plus de requêtes en vol que de connexions : le timeout ne compte
+    # jamais l'attente d'une place dans le pool
+    async with limiter:
         print(f"[CATEGORY] Scraping page {page}: {url}")
+        r = await client.get(url)
+    r.raise_for_status()
 
-        r = requests.get(url, headers=HEADERS, timeout=10)
-        r.raise_for_status()
+    # parsing CPU-bound dans un thread, pendant que les autres pages arrivent
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(None, extract_article_urls, r.text)
 
-        soup = BeautifulSoup(r.text, "lxml")
+async def scrape_category_pages() -> list[str]:
+    seen = set()
+    article_urls = []
+    limiter = asyncio.Semaphore(MAX_CONNECTIONS)
 
-        articles = soup.find_all("article")
-        for article in articles:
-            h2 = article.find("h2")
-            if not h2:
-                continue
+    async with httpx.AsyncClient(
+        http2=True,
+        headers=HEADERS,
+        timeout=10,
+        follow_redirects=True,
+        limits=httpx.Limits(max_connections=MAX_CONNECTIONS, max_keepalive_connections=MAX_CONNECTIONS),
+    ) as client:
+        results = await asyncio.gather(
+            *(_scrape_page(client, limiter, page) for page in range(1, TOTAL_PAGES + 1)),
+            return_exceptions=True,
+        )
 
-            link = h2.find("a", href=True)
-            if link:
-                article_urls.add(link["href"])
+    for page, result in enumerate(results, 1):
+        if isinstance(result, Exception):
+            print(f"[CATEGORY] Page {page} failed: {result}")
+            continue
+        for url in result:
+            if url not in seen:
+                seen.add(url)
+                article_urls.append(url)
 
-    return list(article_urls)
+    return article_urls
@@ -3,9 +3,11 @@ Course generation endpoints router
 """
 import os
 import uuid
-from fastapi import APIRouter, HTTPException, Depends
-from fastapi.responses import StreamingResponse, FileResponse
-from datetime import datetime
+from fastapi import APIRouter, HTTPException, Depends, Request
+from fastapi.responses import Response, StreamingResponse, FileResponse
+import time
+import hashlib
+import orjson
 
 from app.models.schemas import ChatRequest
 from app.core.auth import get_current_user
@@ -14,19 +16,40 @@ from config_loader import settings
 
 router = APIRouter(prefix="/course", tags=["Course Generation"])
 
+# Fixed model creation time (2025-01-01 UTC): every worker builds the same body and ETag
+_MODEL_CREATED = 1735689600
+
+# The model list never changes while the server runs: serialize it once at import
+_MODELS_BODY = orjson.dumps({
+    "object": "list",
+    "data": [{
+        "id": "course-generator",
+        "object": "model",
+        "created": _MODEL_CREATED,
+        "owned_by": "custom"
+    }]
+})
+_MODELS_ETAG = f'"{hashlib.blake2b(_MODELS_BODY, digest_size=16).hexdigest()}"'
+_MODELS_HEADERS = {"ETag": _MODELS_ETAG, "Cache-Control": "private, max-age=60"}
+
+# Downloads must resolve inside this directory (symlinks and ".." resolved)
+_DOWNLOAD_ROOT = os.path.realpath(settings.DOWNLOAD_ALLOWED_BASE_PATH)
+
+_MEDIA_TYPES = {
+    ".docx": "application/vnd.openxmlformats-officedocument.wordprocessingml.document",
+    ".txt": "text/plain",
+    ".log": "text/plain",
+    ".md": "text/markdown",
+    ".json": "application/json",
+}
+
 
 @router.get("/models")
-async def course_models(current_user: dict = Depends(get_current_user)):
-    """List available course generation models"""
-    return {
-        "object": "list",
-        "data": [{
-            "id": "course-generator",
-            "object": "model",
-            "created": int(datetime.now().timestamp()),
-            "owned_by": "custom"
-        }]
-    }
+async def course_models(request: Request, current_user: dict = Depends(get_current_user)):
+    """List available course generation models (static: served from a pre-built body with an ETag)"""
+    if request.headers.get("if-none-match") == _MODELS_ETAG:
+        return Response(status_code=304, headers=_MODELS_HEADERS)
+    return Response(content=_MODELS_BODY, media_type="application/json", headers=_MODELS_HEADERS)
 
 
 @router.post("/api/chat/completions")
@@ -36,16 +59,17 @@ async def course_chat(request: ChatRequest, current_user: dict = Depends(get_cur
 
     Generates a complete course based on the subject provided
     """
-    user_messages = [msg for msg in request.messages if msg.role == "user"]
-    if not user_messages:
+    # Last user message, scanning back from the end of the history
+    last_user = next((msg for msg in reversed(request.messages) if msg.role == "user"), None)
+    if last_user is None:
         raise HTTPException(status_code=400, detail="Aucun message utilisateur trouvé")
 
-    subject = user_messages[-1].content.strip()
+    subject = last_user.content.strip()
     if not subject:
         return {
             "id": f"chatcmpl-{uuid.uuid4().hex[:12]}",
             "object": "chat.completion",
-            "created": int(datetime.now().timestamp()),
+            "created": int(time.time()),
             "model": request.model,
             "choices": [{
                 "index": 0,
@@ -79,24 +103,21 @@ async def course_download(filename: str):
     file_path = os.path.normpath(filename)
     print(file_path)
 
-    if not file_path.startswith(settings.DOWNLOAD_ALLOWED_BASE_PATH):
+    real_path = os.path.realpath(file_path)
+    if os.path.commonpath([_DOWNLOAD_ROOT, real_path]) != _DOWNLOAD_ROOT:
         raise HTTPException(status_code=403, detail="Access denied")
 
-    if not os.path.exists(file_path):
+    try:
+        stat_result = os.stat(real_path)
+    except FileNotFoundError:
         raise HTTPException(status_code=404, detail="File not found")
 
-    media_type = "application/octet-stream"
-    if file_path.endswith('.docx'):
-        media_type = "application/vnd.openxmlformats-officedocument.wordprocessingml.document"
-    elif file_path.endswith('.txt') or file_path.endswith('.log'):
-        media_type = "text/plain"
-    elif file_path.endswith('.md'):
-        media_type = "text/markdown"
-    elif file_path.endswith('.json'):
-        media_type = "application/json"
+    media_type = _MEDIA_TYPES.get(os.path.splitext(real_path)[1].lower(), "application/octet-stream")
 
+    # Pass the stat result so Starlette doesn't stat the file again
     return FileResponse(
-        path=file_path,
+        path=real_path,
         media_type=media_type,
-        filename=os.path.basename(file_path)
+        filename=os.path.basename(file_path),
+        stat_result=stat_result
     )
@@ -1,32 +1,50 @@
 """
 RAG endpoints router
 """
-from fastapi import APIRouter, HTTPException, Depends
-from fastapi.responses import StreamingResponse
-from datetime import datetime
+from fastapi import APIRouter, HTTPException, Depends, Request
+from fastapi.responses import Response, StreamingResponse
+import time
+import hashlib
+import orjson
 import uuid
 
 from app.models.schemas import ChatRequest
 from app.core.auth import get_current_user
 from app.services.rag_service import stream_rag_response
-from rag_engine.rag import query_rag
+from rag_engine.rag import aquery_rag, semantic_cache
 from config_loader import settings
 
 router = APIRouter(prefix="/rag", tags=["RAG"])
 
+# Fixed model creation time (2025-01-01 UTC): every worker builds the same body and ETag
+_MODEL_CREATED = 1735689600
+
+# The model list never changes while the server runs: serialize it once at import
+_MODELS_BODY = orjson.dumps({
+    "object": "list",
+    "data": [{
+        "id": "rag-hybrid",
+        "object": "model",
+        "created": _MODEL_CREATED,
+        "owned_by": "custom"
+    }]
+})
+_MODELS_ETAG = f'"{hashlib.blake2b(_MODELS_BODY, digest_size=16).hexdigest()}"'
+_MODELS_HEADERS = {"ETag": _MODELS_ETAG, "Cache-Control": "private, max-age=60"}
+
 
 @router.get("/models")
-async def rag_models(current_user: dict = Depends(get_current_user)):
-    """List available RAG models"""
-    return {
-        "object": "list",
-        "data": [{
-            "id": "rag-hybrid",
-            "object": "model",
-            "created": int(datetime.now().timestamp()),
-            "owned_by": "custom"
-        }]
-    }
+async def rag_models(request: Request, current_user: dict = Depends(get_current_user)):
+    """List available RAG models (static: served from a pre-built body with an ETag)"""
+    if request.headers.get("if-none-match") == _MODELS_ETAG:
+        return Response(status_code=304, headers=_MODELS_HEADERS)
+    return Response(content=_MODELS_BODY, media_type="application/json", headers=_MODELS_HEADERS)
+
+
+@router.get("/cache/stats")
+async def rag_cache_stats(current_user: dict = Depends(get_current_user)):
+    """Semantic cache hit/miss counters"""
+    return semantic_cache.stats()
 
 
 @router.post("/api/chat/completions")
@@ -36,11 +54,12 @@ async def rag_chat(request: ChatRequest, current_user: dict = Depends(get_curren
 
     Supports both streaming and non-streaming responses
     """
-    user_messages = [msg for msg in request.messages if msg.role == "user"]
-    if not user_messages:
+    # Last user message, scanning back from the end of the history
+    last_user = next((msg for msg in reversed(request.messages) if msg.role == "user"), None)
+    if last_user is None:
         raise HTTPException(status_code=400, detail="No user message found")
 
-    question = user_messages[-1].content
+    question = last_user.content
     top_k = request.top_k or settings.RAG_DEFAULT_TOP_K
 
     if request.stream:
@@ -54,17 +73,21 @@ async def rag_chat(request: ChatRequest, current_user: dict = Depends(get_curren
             }
         )
     else:
-        answer_with_links, used_sources = query_rag(question, top_k=top_k)
+        # Retrieval runs in a worker thread, generation is awaited on the event loop
+        answer_with_links, used_sources = await aquery_rag(question, top_k=top_k)
         if used_sources:
-            sources_text = "\n\n**Sources:**\n"
-            for idx, source in enumerate(used_sources, 1):
-                sources_text += f"{idx}. [{source['title']}]({source['url']})\n"
-            answer_with_links += sources_text
+            answer_with_links += "\n\n**Sources:**\n" + "".join(
+                f"{idx}. [{source['title']}]({source['url']})\n"
+                for idx, source in enumerate(used_sources, 1)
+            )
+
+        prompt_tokens = len(question.split())
+        completion_tokens = len(answer_with_links.split())
 
         return {
             "id": f"chatcmpl-{uuid.uuid4().hex[:12]}",
             "object": "chat.completion",
-            "created": int(datetime.now().timestamp()),
+            "created": int(time.time()),
             "model": request.model,
             "choices": [{
                 "index": 0,
@@ -72,8 +95,8 @@ async def rag_chat(request: ChatRequest, current_user: dict = Depends(get_curren
                 "finish_reason": "stop"
             }],
             "usage": {
-                "prompt_tokens": len(question.split()),
-                "completion_tokens": len(answer_with_links.split()),
-                "total_tokens": len(question.split()) + len(answer_with_links.split())
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": completion_tokens,
+                "total_tokens": prompt_tokens + completion_tokens
             }
         }
@@ -7,6 +7,9 @@ from config_loader import settings
 
 VALID_TOKENS = settings.get_auth_tokens()
 
+_BEARER_PREFIX = "Bearer "
+_lookup_user = VALID_TOKENS.get
+
 
 async def get_current_user(authorization: str = Header(None)):
     """
@@ -24,9 +27,14 @@ async def get_current_user(authorization: str = Header(None)):
     if not authorization:
         raise HTTPException(status_code=401, detail="Authorization header missing")
 
-    token = authorization.replace("Bearer ", "")
+    # Strip only a leading scheme; a bare token is still accepted
+    if authorization.startswith(_BEARER_PREFIX):
+        token = authorization[len(_BEARER_PREFIX):]
+    else:
+        token = authorization
 
-    if token not in VALID_TOKENS:
+    user = _lookup_user(token)
+    if user is None:
         raise HTTPException(status_code=401, detail="Invalid token")
 
-    return VALID_TOKENS[token]
+    return user
@@ -1,10 +1,35 @@
 """
 Main FastAPI application factory
 """
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import ORJSONResponse, Response
+import orjson
 from config_loader import settings
 from app.api.routes import rag, course
+from rag_engine.rag import semantic_cache
+
+# Root endpoint body never changes: serialize it once at import
+ROOT_BODY = orjson.dumps({
+    "status": "ok",
+    "service": "RAG & Course Generation Server",
+    "version": "1.0.0",
+    "endpoints": {
+        "rag": "/rag",
+        "course": "/course"
+    }
+})
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Persist the RAG semantic cache on shutdown (single-worker runs only)"""
+    yield
+    # With several workers each process holds its own partial cache and they
+    # would all race on the same file: only a single worker persists it
+    if settings.DEV_MODE or settings.WORKERS == 1:
+        semantic_cache.save(settings.RAG_SEMANTIC_CACHE_PATH)
 
 
 def create_app() -> FastAPI:
@@ -17,7 +42,9 @@ def create_app() -> FastAPI:
     app = FastAPI(
         title="RAG Server for LibreChat",
         description="RAG and Course Generation API",
-        version="1.0.0"
+        version="1.0.0",
+        default_response_class=ORJSONResponse,
+        lifespan=lifespan
     )
 
     # Configure CORS
@@ -36,15 +63,7 @@ def create_app() -> FastAPI:
     # Root endpoint
     @app.get("/")
     async def root():
-        return {
-            "status": "ok",
-            "service": "RAG & Course Generation Server",
-            "version": "1.0.0",
-            "endpoints": {
-                "rag": "/rag",
-                "course": "/course"
-            }
-        }
+        return Response(content=ROOT_BODY, media_type="application/json")
 
     return app
 
@@ -1,18 +1,22 @@
 """
 Pydantic models and schemas for API requests/responses
 """
-from pydantic import BaseModel
-from typing import Optional, List
+from pydantic import BaseModel, ConfigDict
+from typing import Literal, Optional, List
 
 
 class ChatMessage(BaseModel):
     """Chat message model"""
-    role: str
+    model_config = ConfigDict(extra='ignore')
+
+    role: Literal["user", "assistant", "system", "tool"]
     content: str
 
 
 class ChatRequest(BaseModel):
     """Chat completion request model"""
+    model_config = ConfigDict(extra='ignore')
+
     model: str = "rag-hybrid"
     messages: List[ChatMessage]
     stream: bool = True
@@ -2,13 +2,27 @@
 Course generation service
 """
 import os
-import json
 import asyncio
 import uuid
-from datetime import datetime
+import time
+import orjson
 from course_build_agents.orchestrator_with_logging import stream_course_generation_progress
 from config_loader import settings
 
+def iter_escaped_chunks(text: str):
+    """
+    Yield text in RAG_CHUNK_SIZE-character slices, each JSON-escaped.
+
+    Slicing the str (not the encoded bytes) never splits a character, and
+    orjson escapes each slice as fast as a regex could find the boundaries.
+
+    Yields:
+        bytes: JSON-escaped chunk without the surrounding quotes
+    """
+    size = settings.RAG_CHUNK_SIZE
+    for i in range(0, len(text), size):
+        yield orjson.dumps(text[i:i + size])[1:-1]
+
 
 async def stream_course_generation(subject: str, model: str = "course-generator"):
     """
@@ -19,10 +33,10 @@ async def stream_course_generation(subject: str, model: str = "course-generator"
         model: Model identifier
 
     Yields:
-        str: Server-sent events formatted response chunks
+        bytes: Server-sent events formatted response chunks
     """
     message_id = f"chatcmpl-{uuid.uuid4().hex[:12]}"
-    created_timestamp = int(datetime.now().timestamp())
+    created_timestamp = int(time.time())
 
     config = {
         'retriever_top_k': settings.COURSE_RETRIEVER_TOP_K,
@@ -30,50 +44,35 @@ async def stream_course_generation(subject: str, model: str = "course-generator"
         'enhancer_top_k': settings.COURSE_ENHANCER_TOP_K,
     }
 
-    try:
-        loop = asyncio.get_event_loop()
+    def make_chunk(delta, finish_reason=None):
+        """Serialize one chat.completion.chunk SSE frame for this stream."""
+        return b"data: " + orjson.dumps({
+            "id": message_id,
+            "object": "chat.completion.chunk",
+            "created": created_timestamp,
+            "model": model,
+            "choices": [{
+                "index": 0,
+                "delta": delta,
+                "finish_reason": finish_reason
+            }]
+        }) + b"\n\n"
 
-        # Track last heartbeat time
-        last_heartbeat = asyncio.get_event_loop().time()
+    try:
         heartbeat_interval = 10  # seconds
 
-        # Run the streaming generator in executor and process updates
+        # Consume the progress generator, with heartbeats while a phase is running
         async for update in async_stream_wrapper_with_heartbeat(
-            loop, stream_course_generation_progress, subject, config,
-            message_id, created_timestamp, model, heartbeat_interval
+            stream_course_generation_progress(subject, config),
+            heartbeat_interval=heartbeat_interval
         ):
             if update['type'] == 'heartbeat':
                 # Send heartbeat (empty content to maintain connection)
-                heartbeat_chunk = {
-                    "id": message_id,
-                    "object": "chat.completion.chunk",
-                    "created": created_timestamp,
-                    "model": model,
-                    "choices": [{
-                        "index": 0,
-                        "delta": {},
-                        "finish_reason": None
-                    }]
-                }
-                yield f"data: {json.dumps(heartbeat_chunk)}\n\n"
+                yield make_chunk({})
 
             elif update['type'] == 'progress':
                 # Send progress as reasoning_content (appears in thinking box)
-                progress_chunk = {
-                    "id": message_id,
-                    "object": "chat.completion.chunk",
-                    "created": created_timestamp,
-                    "model": model,
-                    "choices": [{
-                        "index": 0,
-                        "delta": {
-                            "role": "assistant",
-                            "reasoning_content": update['content']
-                        },
-                        "finish_reason": None
-                    }]
-                }
-                yield f"data: {json.dumps(progress_chunk)}\n\n"
+                yield make_chunk({"role": "assistant", "reasoning_content": update['content']})
 
             elif update['type'] == 'complete':
                 # Get final results
@@ -91,121 +90,58 @@ async def stream_course_generation(subject: str, model: str = "course-generator"
 
                 final_content = course_markdown + summary
 
+                # Only the content string changes between chunks: build the
+                # surrounding SSE envelope once and serialize just the text
+                content_prefix = b"".join((
+                    b'data: {"id":', orjson.dumps(message_id),
+                    b',"object":"chat.completion.chunk","created":', orjson.dumps(created_timestamp),
+                    b',"model":', orjson.dumps(model),
+                    b',"choices":[{"index":0,"delta":{"content":"',
+                ))
+                content_suffix = b'"},"finish_reason":null}]}\n\n'
+
                 # Stream the markdown content in chunks (like RAG does)
-                chunk_size = settings.RAG_CHUNK_SIZE
-                for i in range(0, len(final_content), chunk_size):
-                    chunk = final_content[i:i+chunk_size]
-                    chunk_data = {
-                        "id": message_id,
-                        "object": "chat.completion.chunk",
-                        "created": created_timestamp,
-                        "model": model,
-                        "choices": [{
-                            "index": 0,
-                            "delta": {"content": chunk},
-                            "finish_reason": None
-                        }]
-                    }
-                    yield f"data: {json.dumps(chunk_data)}\n\n"
-                    await asyncio.sleep(settings.RAG_CHUNK_DELAY)
+                for chunk in iter_escaped_chunks(final_content):
+                    yield b"".join((content_prefix, chunk, content_suffix))
+                    # Yield to the event loop; the server's send queue provides backpressure
+                    await asyncio.sleep(0)
 
         # Send finish signal
-        final_chunk = {
-            "id": message_id,
-            "object": "chat.completion.chunk",
-            "created": created_timestamp,
-            "model": model,
-            "choices": [{
-                "index": 0,
-                "delta": {},
-                "finish_reason": "stop"
-            }]
-        }
-        yield f"data: {json.dumps(final_chunk)}\n\n"
-        yield "data: [DONE]\n\n"
+        yield make_chunk({}, "stop")
+        yield b"data: [DONE]\n\n"
 
     except Exception as e:
-        error_chunk = {
-            "id": message_id,
-            "object": "chat.completion.chunk",
-            "created": created_timestamp,
-            "model": model,
-            "choices": [{
-                "index": 0,
-                "delta": {"content": f"\n\nErreur: {str(e)}"},
-                "finish_reason": "stop"
-            }]
-        }
-        yield f"data: {json.dumps(error_chunk)}\n\n"
-        yield "data: [DONE]\n\n"
+        yield make_chunk({"content": f"\n\nErreur: {str(e)}"}, "stop")
+        yield b"data: [DONE]\n\n"
 
 
-async def async_stream_wrapper_with_heartbeat(loop, generator_func, *args, heartbeat_interval=10):
+async def async_stream_wrapper_with_heartbeat(agen, heartbeat_interval=10):
     """
-    Wrapper to run a generator function and yield results asynchronously in real-time.
+    Iterate an async generator and yield its items in real-time.
     Sends heartbeat messages every heartbeat_interval seconds to maintain connection.
+
+    The pending anext() is kept in a task across heartbeats instead of being
+    cancelled by a timeout, so the producer is never interrupted mid-step.
     """
-    import queue
-    import threading
-    import time
-
-    result_queue = queue.Queue()
-
-    def run_generator():
-        try:
-            # Extract the actual args (excluding heartbeat params)
-            actual_args = args[:2]  # subject, config
-            for item in generator_func(*actual_args):
-                result_queue.put(('item', item))
-        except Exception as e:
-            result_queue.put(('error', e))
-        finally:
-            result_queue.put(('done', None))
-
-    # Start generator in background thread
-    thread = threading.Thread(target=run_generator, daemon=True)
-    thread.start()
-
-    # Track last heartbeat time
-    last_heartbeat = time.time()
-
-    # Yield items as they come
-    while True:
-        # Check if we need to send a heartbeat
-        current_time = time.time()
-        if current_time - last_heartbeat >= heartbeat_interval:
-            yield {'type': 'heartbeat'}
-            last_heartbeat = current_time
-
-        # Non-blocking check with timeout
-        try:
-            # Use get_nowait in executor to avoid blocking
-            def get_with_timeout():
-                try:
-                    return result_queue.get(timeout=0.1)
-                except queue.Empty:
-                    return None
-
-            result = await loop.run_in_executor(None, get_with_timeout)
-
-            if result is None:
-                # Queue was empty, continue waiting
-                await asyncio.sleep(0.01)
-                continue
+    pending = None
+    try:
+        while True:
+            if pending is None:
+                pending = asyncio.ensure_future(anext(agen))
 
-            msg_type, data = result
+            done, _ = await asyncio.wait({pending}, timeout=heartbeat_interval)
+            if not done:
+                yield {'type': 'heartbeat'}
+                continue
 
-            if msg_type == 'item':
-                yield data
-            elif msg_type == 'error':
-                raise data
-            elif msg_type == 'done':
+            task, pending = pending, None
+            try:
+                item = task.result()
+            except StopAsyncIteration:
                 break
-
-        except Exception as e:
-            # Re-raise if it's not a queue timeout
-            if not isinstance(e, queue.Empty):
-                raise
-
-    # Wait for thread to finish
-    thread.join(timeout=1)
+            yield item
+    finally:
+        if pending is not None:
+            pending.cancel()
+            await asyncio.wait({pending})
+        await agen.aclose()
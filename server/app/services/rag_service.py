@@ -1,17 +1,39 @@
 """
 RAG service for streaming responses
 """
-import json
-import asyncio
+import orjson
 import uuid
-from datetime import datetime
-from rag_engine.rag import stream_rag_with_thinking
+import time
+from rag_engine.rag import astream_rag_with_thinking
 from config_loader import settings
 
 # --- FORCE le modèle Ollama exact pour éviter le 404 ---
 DEFAULT_RAG_MODEL = "mistral:latest"
 
 
+def _thinking_envelope(message_id: str, created_timestamp: int, model: str):
+    """
+    Pre-serialize a thinking chunk around its reasoning_content value
+
+    Returns:
+        tuple: (prefix, suffix) so that prefix + JSON string + suffix is a full SSE event
+    """
+    marker = '"reasoning_content":""'
+    envelope = orjson.dumps({
+        "id": message_id,
+        "object": "chat.completion.chunk",
+        "created": created_timestamp,
+        "model": model,
+        "choices": [{
+            "index": 0,
+            "delta": {"role": "assistant", "reasoning_content": ""},
+            "finish_reason": None
+        }]
+    }).decode()
+    cut = envelope.index(marker) + len(marker) - 2
+    return "data: " + envelope[:cut], envelope[cut + 2:] + "\n\n"
+
+
 async def stream_rag_response(question: str, top_k: int = 5, model: str = None):
     """
     Stream RAG response with thinking from Ollama, then corrected final response
@@ -29,29 +51,16 @@ async def stream_rag_response(question: str, top_k: int = 5, model: str = None):
 
     try:
         message_id = f"chatcmpl-{uuid.uuid4().hex[:12]}"
-        created_timestamp = int(datetime.now().timestamp())
+        created_timestamp = int(time.time())
 
-        loop = asyncio.get_event_loop()
+        # Only the token changes between thinking chunks
+        thinking_prefix, thinking_suffix = _thinking_envelope(message_id, created_timestamp, model)
 
-        # Use the async wrapper to stream in real-time
-        async for update in async_rag_stream_wrapper(loop, stream_rag_with_thinking, question, top_k, model):
+        # Ollama deltas arrive on the event loop as they are generated
+        async for update in astream_rag_with_thinking(question, top_k):
             if update['type'] == 'thinking':
                 # Stream Ollama response as reasoning_content (thinking box)
-                thinking_chunk = {
-                    "id": message_id,
-                    "object": "chat.completion.chunk",
-                    "created": created_timestamp,
-                    "model": model,
-                    "choices": [{
-                        "index": 0,
-                        "delta": {
-                            "role": "assistant",
-                            "reasoning_content": update['content']
-                        },
-                        "finish_reason": None
-                    }]
-                }
-                yield f"data: {json.dumps(thinking_chunk)}\n\n"
+                yield thinking_prefix + orjson.dumps(update['content']).decode() + thinking_suffix
 
             elif update['type'] == 'final':
                 # Send final corrected response with sources
@@ -59,10 +68,10 @@ async def stream_rag_response(question: str, top_k: int = 5, model: str = None):
                 used_sources = update['sources']
 
                 if used_sources:
-                    sources_text = "\n\n**Sources:**\n"
-                    for idx, source in enumerate(used_sources, 1):
-                        sources_text += f"{idx}. [{source['title']}]({source['url']})\n"
-                    answer_with_links += sources_text
+                    answer_with_links += "\n\n**Sources:**\n" + "".join(
+                        f"{idx}. [{source['title']}]({source['url']})\n"
+                        for idx, source in enumerate(used_sources, 1)
+                    )
 
                 # Send complete final response
                 final_content_chunk = {
@@ -76,7 +85,7 @@ async def stream_rag_response(question: str, top_k: int = 5, model: str = None):
                         "finish_reason": "stop"
                     }]
                 }
-                yield f"data: {json.dumps(final_content_chunk)}\n\n"
+                yield f"data: {orjson.dumps(final_content_chunk).decode()}\n\n"
 
         yield "data: [DONE]\n\n"
 
@@ -84,7 +93,7 @@ async def stream_rag_response(question: str, top_k: int = 5, model: str = None):
         error_chunk = {
             "id": f"chatcmpl-{uuid.uuid4().hex[:12]}",
             "object": "chat.completion.chunk",
-            "created": int(datetime.now().timestamp()),
+            "created": int(time.time()),
             "model": model,
             "choices": [{
                 "index": 0,
@@ -92,54 +101,5 @@ async def stream_rag_response(question: str, top_k: int = 5, model: str = None):
                 "finish_reason": "stop"
             }]
         }
-        yield f"data: {json.dumps(error_chunk)}\n\n"
+        yield f"data: {orjson.dumps(error_chunk).decode()}\n\n"
         yield "data: [DONE]\n\n"
-
-
-async def async_rag_stream_wrapper(loop, generator_func, *args):
-    """Wrapper to run RAG streaming generator in real-time."""
-    import queue
-    import threading
-
-    result_queue = queue.Queue()
-
-    def run_generator():
-        try:
-            for item in generator_func(*args):
-                result_queue.put(('item', item))
-        except Exception as e:
-            result_queue.put(('error', e))
-        finally:
-            result_queue.put(('done', None))
-
-    # Start generator in background thread
-    thread = threading.Thread(target=run_generator, daemon=True)
-    thread.start()
-
-    # Yield items as they come
-    while True:
-        # Non-blocking check with timeout
-        def get_with_timeout():
-            try:
-                return result_queue.get(timeout=0.1)
-            except queue.Empty:
-                return None
-
-        result = await loop.run_in_executor(None, get_with_timeout)
-
-        if result is None:
-            # Queue was empty, continue waiting
-            await asyncio.sleep(0.01)
-            continue
-
-        msg_type, data = result
-
-        if msg_type == 'item':
-            yield data
-        elif msg_type == 'error':
-            raise data
-        elif msg_type == 'done':
-            break
-
-    # Wait for thread to finish
-    thread.join(timeout=1)
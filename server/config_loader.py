@@ -5,7 +5,8 @@ Loads settings from config.ini and environment variables.
 import os
 import configparser
 from pathlib import Path
-from typing import Dict
+from dataclasses import dataclass, field
+from typing import Dict, List
 from dotenv import load_dotenv
 
 # Load environment variables from .env file
@@ -20,59 +21,74 @@ config_path = BASE_DIR / 'config.ini'
 config.read(config_path)
 
 
+@dataclass(frozen=True, slots=True)
 class Config:
-    """Configuration class that combines config.ini and environment variables."""
+    """Configuration class that combines config.ini and environment variables.
+
+    Values are read once at import; the frozen slotted instance gives
+    read-only settings with plain slot lookups on access.
+    """
 
     # Server Configuration
-    SERVER_HOST = config.get('server', 'host', fallback='0.0.0.0')
-    SERVER_PORT = config.getint('server', 'port', fallback=8080)
-    LOG_LEVEL = config.get('server', 'log_level', fallback='info')
+    SERVER_HOST: str = config.get('server', 'host', fallback='0.0.0.0')
+    SERVER_PORT: int = config.getint('server', 'port', fallback=8080)
+    LOG_LEVEL: str = config.get('server', 'log_level', fallback='info')
+    # dev_mode: single worker with auto-reload; otherwise `workers` (0 = one per core)
+    DEV_MODE: bool = config.getboolean('server', 'dev_mode', fallback=False)
+    WORKERS: int = config.getint('server', 'workers', fallback=1) or os.cpu_count() or 1
 
     # CORS Configuration
-    CORS_ALLOW_ORIGINS = config.get('cors', 'allow_origins', fallback='*').split(',')
-    CORS_ALLOW_CREDENTIALS = config.getboolean('cors', 'allow_credentials', fallback=True)
-    CORS_ALLOW_METHODS = config.get('cors', 'allow_methods', fallback='*').split(',')
-    CORS_ALLOW_HEADERS = config.get('cors', 'allow_headers', fallback='*').split(',')
+    CORS_ALLOW_ORIGINS: List[str] = field(default_factory=lambda: config.get('cors', 'allow_origins', fallback='*').split(','))
+    CORS_ALLOW_CREDENTIALS: bool = config.getboolean('cors', 'allow_credentials', fallback=True)
+    CORS_ALLOW_METHODS: List[str] = field(default_factory=lambda: config.get('cors', 'allow_methods', fallback='*').split(','))
+    CORS_ALLOW_HEADERS: List[str] = field(default_factory=lambda: config.get('cors', 'allow_headers', fallback='*').split(','))
 
     # RAG Configuration
     # Force Ollama model to mistral:latest
-    RAG_MODEL = "mistral:latest"
-    RAG_DEFAULT_TOP_K = config.getint('rag', 'default_top_k', fallback=30)
-    RAG_CHUNK_SIZE = config.getint('rag', 'chunk_size', fallback=5)
-    RAG_CHUNK_DELAY = config.getfloat('rag', 'chunk_delay', fallback=0.01)
-    RAG_TEMPERATURE = config.getfloat('rag', 'temperature', fallback=0.7)
+    RAG_MODEL: str = "mistral:latest"
+    RAG_DEFAULT_TOP_K: int = config.getint('rag', 'default_top_k', fallback=30)
+    RAG_CHUNK_SIZE: int = config.getint('rag', 'chunk_size', fallback=5)
+    RAG_CHUNK_DELAY: float = config.getfloat('rag', 'chunk_delay', fallback=0.01)
+    RAG_TEMPERATURE: float = config.getfloat('rag', 'temperature', fallback=0.7)
+    RAG_KEEP_ALIVE: str = config.get('rag', 'keep_alive', fallback='30m')
+    RAG_SEMANTIC_CACHE_THRESHOLD: float = config.getfloat('rag', 'semantic_cache_threshold', fallback=0.90)
+    RAG_SEMANTIC_CACHE_SIZE: int = config.getint('rag', 'semantic_cache_size', fallback=10000)
+    RAG_SEMANTIC_CACHE_PATH: str = config.get('rag', 'semantic_cache_path', fallback='./rag_cache/semantic_cache.pkl')
+    RAG_SEMANTIC_CACHE_TTL: int = config.getint('rag', 'semantic_cache_ttl', fallback=3600)
 
     # Hybrid Retriever Configuration
-    EMBED_MODEL = config.get('hybrid_retriever', 'embed_model', fallback='embeddinggemma')
-    BM25_WEIGHT = config.getfloat('hybrid_retriever', 'bm25_weight', fallback=0.5)
-    VECTOR_WEIGHT = config.getfloat('hybrid_retriever', 'vector_weight', fallback=0.5)
-    RETRIEVER_TOP_K = config.getint('hybrid_retriever', 'top_k', fallback=8)
-    RETRIEVER_FINAL_K = config.getint('hybrid_retriever', 'final_k', fallback=5)
+    EMBED_MODEL: str = config.get('hybrid_retriever', 'embed_model', fallback='embeddinggemma')
+    BM25_WEIGHT: float = config.getfloat('hybrid_retriever', 'bm25_weight', fallback=0.5)
+    VECTOR_WEIGHT: float = config.getfloat('hybrid_retriever', 'vector_weight', fallback=0.5)
+    RETRIEVER_TOP_K: int = config.getint('hybrid_retriever', 'top_k', fallback=8)
+    RETRIEVER_FINAL_K: int = config.getint('hybrid_retriever', 'final_k', fallback=5)
 
     # Course Generation Configuration
-    COURSE_RETRIEVER_TOP_K = config.getint('course_generation', 'retriever_top_k', fallback=5)
-    COURSE_ENHANCER_ITERATIONS = config.getint('course_generation', 'enhancer_iterations', fallback=3)
-    COURSE_ENHANCER_TOP_K = config.getint('course_generation', 'enhancer_top_k', fallback=5)
-    COURSE_OUTPUT_BASE_DIR = config.get('course_generation', 'output_base_dir', fallback='./course_outputs')
-    COURSE_ENABLE_LOGGING = config.getboolean('course_generation', 'enable_logging', fallback=True)
-    COURSE_HEARTBEAT_INTERVAL = config.getint('course_generation', 'heartbeat_interval', fallback=10)
+    COURSE_RETRIEVER_TOP_K: int = config.getint('course_generation', 'retriever_top_k', fallback=5)
+    COURSE_ENHANCER_ITERATIONS: int = config.getint('course_generation', 'enhancer_iterations', fallback=3)
+    COURSE_ENHANCER_TOP_K: int = config.getint('course_generation', 'enhancer_top_k', fallback=5)
+    COURSE_OUTPUT_BASE_DIR: str = config.get('course_generation', 'output_base_dir', fallback='./course_outputs')
+    COURSE_ENABLE_LOGGING: bool = config.getboolean('course_generation', 'enable_logging', fallback=True)
+    COURSE_HEARTBEAT_INTERVAL: int = config.getint('course_generation', 'heartbeat_interval', fallback=10)
+    COURSE_CHAPTER_CONCURRENCY: int = config.getint('course_generation', 'chapter_concurrency', fallback=4)
 
     # Paths Configuration
-    SPACY_MODEL = config.get('paths', 'spacy_model', fallback='fr_core_news_sm')
+    SPACY_MODEL: str = config.get('paths', 'spacy_model', fallback='fr_core_news_sm')
 
     # Download Configuration
-    DOWNLOAD_ALLOWED_BASE_PATH = config.get('download', 'allowed_base_path', fallback='course_outputs')
+    DOWNLOAD_ALLOWED_BASE_PATH: str = config.get('download', 'allowed_base_path', fallback='course_outputs')
 
     # Environment Variables (API URLs and sensitive data)
-    ELASTICSEARCH_URL = os.getenv('ELASTICSEARCH_URL', 'http://localhost:9200')
-    ELASTICSEARCH_INDEX = os.getenv('ELASTICSEARCH_INDEX', 'btp_bm25_v2_index')
+    ELASTICSEARCH_URL: str = os.getenv('ELASTICSEARCH_URL', 'http://localhost:9200')
+    ELASTICSEARCH_INDEX: str = os.getenv('ELASTICSEARCH_INDEX', 'btp_bm25_v2_index')
 
-    QDRANT_URL = os.getenv('QDRANT_URL', 'http://localhost:6333')
-    QDRANT_COLLECTION = os.getenv('QDRANT_COLLECTION', 'btp_rag_docs_v2')
+    QDRANT_URL: str = os.getenv('QDRANT_URL', 'http://localhost:6333')
+    QDRANT_GRPC_PORT: int = int(os.getenv('QDRANT_GRPC_PORT', '6334'))
+    QDRANT_COLLECTION: str = os.getenv('QDRANT_COLLECTION', 'btp_rag_docs_v2')
 
-    OLLAMA_BASE_URL = os.getenv('OLLAMA_BASE_URL', 'http://localhost:11434')
+    OLLAMA_BASE_URL: str = os.getenv('OLLAMA_BASE_URL', 'http://localhost:11434')
 
-    SERVER_BASE_URL = os.getenv('SERVER_BASE_URL', f'http://localhost:{SERVER_PORT}')
+    SERVER_BASE_URL: str = os.getenv('SERVER_BASE_URL', f'http://localhost:{SERVER_PORT}')
 
     # Authentication Tokens
     @staticmethod
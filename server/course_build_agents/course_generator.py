@@ -1,5 +1,7 @@
-from .utils import call_llm, fix_malformed_json
-import json
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+from config_loader import settings
+from .utils import call_llm, fix_malformed_json, parse_json_response, report
 
 
 class CourseGeneratorAgent:
@@ -13,18 +15,18 @@ class CourseGeneratorAgent:
         
     def generate_course(self, subject, knowledge_base, sources):
         """Generate a complete course structure from the knowledge base."""
-        print(f"\n📚 Agent 3 : Génération de la structure du cours sur '{subject}'...")
+        report(f"\n📚 Agent 3 : Génération de la structure du cours sur '{subject}'...")
 
         # Step 1: Generate course outline
-        print(f"   Étape 1 : Création du plan général du cours...")
+        report(f"   Étape 1 : Création du plan général du cours...")
         outline = self._generate_outline(subject, knowledge_base)
-        print(f"      ✓ Plan créé avec {len(outline.get('chapters', []))} chapitres")
+        report(f"      ✓ Plan créé avec {len(outline.get('chapters', []))} chapitres")
 
         # Step 2: Generate detailed chapter content
-        print(f"   Étape 2 : Détail de chaque chapitre...")
+        report(f"   Étape 2 : Détail de chaque chapitre...")
         detailed_structure = self._generate_detailed_structure(subject, knowledge_base, outline)
 
-        print(f"✅ Agent 3 : Structure du cours générée avec succès")
+        report(f"✅ Agent 3 : Structure du cours générée avec succès")
 
         self.course_structure = detailed_structure
         return detailed_structure
@@ -68,13 +70,11 @@ Return ONLY a JSON object with this structure:
         response = call_llm(system_prompt, user_prompt)
         
         try:
-            start = response.find('{')
-            end = response.rfind('}') + 1
-            outline = json.loads(response[start:end])
+            outline = parse_json_response(response)
             return outline
         except Exception as e:
-            print(f"   Warning: Could not parse outline JSON: {e}")
-            print("    trying to fix malformed JSON...")
+            report(f"   Warning: Could not parse outline JSON: {e}")
+            report("    trying to fix malformed JSON...")
             fixed_json = fix_malformed_json(response, """{
   "course_title": "Title in French",
   "description": "Brief course description",
@@ -86,11 +86,11 @@ Return ONLY a JSON object with this structure:
 }""", str(e))
             if fixed_json:
                 try:
-                    outline = json.loads(fixed_json)
+                    outline = parse_json_response(fixed_json)
                     return outline
                 except Exception as e2:
-                    print(f"   Warning: Could not parse fixed JSON: {e2}")
-            print("   Returning minimal course structure")  
+                    report(f"   Warning: Could not parse fixed JSON: {e2}")
+            report("   Returning minimal course structure")  
             # Return minimal structure
             return {
                 "course_title": f"Course sur {subject}",
@@ -114,12 +114,33 @@ For each chapter:
 - Note practical examples or exercises to include
 - Suggest estimated duration"""
 
-        detailed_chapters = []
-
-        for chapter in outline.get('chapters', []):
-            print(f"      → Chapitre {chapter['chapter_number']} : {chapter['title']}")
+        # Chapters are independent: one LLM call each, dispatched concurrently.
+        # Results are collected in outline order; each task runs in a copy of the
+        # caller's context so report() still reaches this run's logger.
+        chapters = outline.get('chapters', [])
+        with ThreadPoolExecutor(max_workers=max(min(len(chapters), settings.COURSE_CHAPTER_CONCURRENCY), 1)) as pool:
+            futures = [
+                pool.submit(contextvars.copy_context().run, self._generate_chapter, subject, knowledge_base, system_prompt, chapter)
+                for chapter in chapters
+            ]
+            detailed_chapters = [chapter_detail for chapter_detail in (f.result() for f in futures) if chapter_detail is not None]
+        
+        # Assemble complete course structure
+        complete_structure = {
+            "course_title": outline.get('course_title', f"Course sur {subject}"),
+            "description": outline.get('description', ''),
+            "target_audience": outline.get('target_audience', ''),
+            "total_chapters": len(detailed_chapters),
+            "chapters": detailed_chapters
+        }
+        
+        return complete_structure
+    
+    def _generate_chapter(self, subject, knowledge_base, system_prompt, chapter):
+        """Generate the detailed structure of one chapter (None if it cannot be parsed)."""
+        report(f"      → Chapitre {chapter['chapter_number']} : {chapter['title']}")
 
-            user_prompt = f"""Subject: {subject}
+        user_prompt = f"""Subject: {subject}
 
 <knowledge_base>
 {knowledge_base}
@@ -153,18 +174,16 @@ Return ONLY a JSON object with this structure:
   ]
 }}"""
 
-            response = call_llm(system_prompt, user_prompt)
-            
-            try:
-                start = response.find('{')
-                end = response.rfind('}') + 1
-                chapter_detail = json.loads(response[start:end])
-                detailed_chapters.append(chapter_detail)
-                print(f"         ✓ {len(chapter_detail.get('subchapters', []))} sous-chapitres créés")
-            except Exception as e:
-                print(f"         ⚠ Erreur lors de l'analyse du chapitre {chapter['chapter_number']}: {e}")
-                print(f"         → Tentative de correction du JSON...")
-                fixed_json = fix_malformed_json(response, """{{
+        response = call_llm(system_prompt, user_prompt)
+        
+        try:
+            chapter_detail = parse_json_response(response)
+            report(f"         ✓ {len(chapter_detail.get('subchapters', []))} sous-chapitres créés")
+            return chapter_detail
+        except Exception as e:
+            report(f"         ⚠ Erreur lors de l'analyse du chapitre {chapter['chapter_number']}: {e}")
+            report(f"         → Tentative de correction du JSON...")
+            fixed_json = fix_malformed_json(response, """{{
   "chapter_number": {chapter['chapter_number']},
   "title": "{chapter['title']}",
   "description": "{chapter['description']}",
@@ -185,32 +204,21 @@ Return ONLY a JSON object with this structure:
     ...
   ]
 }}""", str(e))
-                if fixed_json:
-                    try:
-                        chapter_detail = json.loads(fixed_json)
-                        detailed_chapters.append(chapter_detail)
-                        print(f"         ✓ {len(chapter_detail.get('subchapters', []))} sous-chapitres créés (après correction)")
-                        continue
-                    except Exception as e2:
-                        print(f"         ✗ Impossible de corriger le JSON pour le chapitre {chapter['chapter_number']}")
-                        # Add minimal structure
-                        detailed_chapters.append({
-                            "chapter_number": chapter['chapter_number'],
-                            "title": chapter['title'],
-                            "description": chapter['description'],
-                            "subchapters": []
-                        })
-        
-        # Assemble complete course structure
-        complete_structure = {
-            "course_title": outline.get('course_title', f"Course sur {subject}"),
-            "description": outline.get('description', ''),
-            "target_audience": outline.get('target_audience', ''),
-            "total_chapters": len(detailed_chapters),
-            "chapters": detailed_chapters
-        }
-        
-        return complete_structure
+            if fixed_json:
+                try:
+                    chapter_detail = parse_json_response(fixed_json)
+                    report(f"         ✓ {len(chapter_detail.get('subchapters', []))} sous-chapitres créés (après correction)")
+                    return chapter_detail
+                except Exception as e2:
+                    report(f"         ✗ Impossible de corriger le JSON pour le chapitre {chapter['chapter_number']}")
+                    # Add minimal structure
+                    return {
+                        "chapter_number": chapter['chapter_number'],
+                        "title": chapter['title'],
+                        "description": chapter['description'],
+                        "subchapters": []
+                    }
+        return None
     
     def get_markdown_content(self):
         """Generate markdown content as a string without saving to file."""
@@ -233,8 +241,7 @@ Return ONLY a JSON object with this structure:
 
             if 'learning_objectives' in chapter:
                 md_content.append(f"\n**Objectifs d'apprentissage:**")
-                for obj in chapter['learning_objectives']:
-                    md_content.append(f"- {obj}")
+                md_content.extend(f"- {obj}" for obj in chapter['learning_objectives'])
                 md_content.append("")
 
             #if 'estimated_duration' in chapter:
@@ -250,14 +257,12 @@ Return ONLY a JSON object with this structure:
 
                     if 'content_to_cover' in subchapter:
                         md_content.append("**Contenu à couvrir:**")
-                        for content in subchapter['content_to_cover']:
-                            md_content.append(f"- {content}")
+                        md_content.extend(f"- {content}" for content in subchapter['content_to_cover'])
                         md_content.append("")
 
                     if 'practical_elements' in subchapter:
                         md_content.append("**Éléments pratiques:**")
-                        for element in subchapter['practical_elements']:
-                            md_content.append(f"- {element}")
+                        md_content.extend(f"- {element}" for element in subchapter['practical_elements'])
                         md_content.append("")
 
             md_content.append("---")
@@ -267,7 +272,7 @@ Return ONLY a JSON object with this structure:
     def export_to_markdown(self, output_path):
         """Export course structure to a readable markdown file."""
         if not self.course_structure:
-            print("No course structure to export")
+            report("No course structure to export")
             return
 
         md_content = self.get_markdown_content()
@@ -276,4 +281,4 @@ Return ONLY a JSON object with this structure:
         with open(output_path, 'w', encoding='utf-8') as f:
             f.write(md_content)
 
-        print(f"   Course structure exported to: {output_path}")
+        report(f"   Course structure exported to: {output_path}")
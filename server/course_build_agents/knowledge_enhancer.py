@@ -1,7 +1,11 @@
-from .utils import context_from_query, call_llm, add_citation_links
+from .utils import context_from_query, call_llm_cached, add_citation_links, report
+from concurrent.futures import ThreadPoolExecutor
 import json
 import re
 
+_BRACKET_RE = re.compile(r'\[')
+_JSON_DECODER = json.JSONDecoder()
+
 
 class KnowledgeEnhancerAgent:
     """
@@ -13,31 +17,33 @@ class KnowledgeEnhancerAgent:
         self.max_iterations = max_iterations
         self.top_k = top_k
         self.enhancement_sources = []
-        
+        self._next_source_id = 1
+
     def enhance_knowledge(self, subject, initial_knowledge, initial_sources):
         """Iteratively enhance knowledge by identifying and filling gaps."""
-        print(f"\n🔬 Agent 2 : Amélioration des connaissances sur '{subject}'...")
+        report(f"\n🔬 Agent 2 : Amélioration des connaissances sur '{subject}'...")
 
         current_knowledge = initial_knowledge
         all_sources = initial_sources.copy()
+        self._next_source_id = max((s['id'] for s in initial_sources), default=0) + 1
 
         for iteration in range(self.max_iterations):
-            print(f"   Itération {iteration + 1}/{self.max_iterations}")
+            report(f"   Itération {iteration + 1}/{self.max_iterations}")
 
             # Identify gaps
             gaps = self._identify_gaps(subject, current_knowledge)
 
             if not gaps or len(gaps) == 0:
-                print("      ✓ Aucune lacune significative trouvée")
+                report("      ✓ Aucune lacune significative trouvée")
                 break
 
-            print(f"      → {len(gaps)} lacunes identifiées")
+            report(f"      → {len(gaps)} lacunes identifiées")
 
             # Fill gaps
             enhancements = self._fill_gaps(subject, gaps, all_sources)
 
             if not enhancements:
-                print("      ✓ Aucune nouvelle information trouvée")
+                report("      ✓ Aucune nouvelle information trouvée")
                 break
 
             # Integrate enhancements
@@ -45,11 +51,11 @@ class KnowledgeEnhancerAgent:
                 subject, current_knowledge, enhancements, all_sources
             )
 
-            print(f"      ✓ {len(self.enhancement_sources)} nouvelles sources ajoutées")
+            report(f"      ✓ {len(self.enhancement_sources)} nouvelles sources ajoutées")
             all_sources.extend(self.enhancement_sources)
             self.enhancement_sources = []
 
-        print(f"✅ Agent 2 : Connaissances enrichies avec {len(all_sources) - len(initial_sources)} sources supplémentaires")
+        report(f"✅ Agent 2 : Connaissances enrichies avec {len(all_sources) - len(initial_sources)} sources supplémentaires")
         return current_knowledge, all_sources
     
     def _identify_gaps(self, subject, knowledge):
@@ -80,32 +86,43 @@ Limit to the 5 most important gaps.
 
 Example format: ["Question about unclear concept X", "Need more detail on Y", "How does Z work in practice?"]"""
 
-        response = call_llm(system_prompt, user_prompt)
-        
-        try:
-            start = response.find('[')
-            end = response.rfind(']') + 1
-            gaps = json.loads(response[start:end])
-            for gap in gaps:
-                print(f"         • Lacune : {gap}")
-            return gaps[:5]  # Limit to 5 most important
-        except:
-            return []
+        response = call_llm_cached(system_prompt, user_prompt)
+
+        # Decode the first JSON array of questions found in the response, starting at
+        # each '[' in turn (an echoed citation such as "[1](url)" decodes to [1]: skipped)
+        last_error = None
+        for match in _BRACKET_RE.finditer(response):
+            try:
+                gaps, _ = _JSON_DECODER.raw_decode(response, match.start())
+            except ValueError as e:
+                last_error = e
+                continue
+            if isinstance(gaps, list) and gaps and all(isinstance(gap, str) and gap for gap in gaps):
+                gaps = gaps[:5]  # Limit to 5 most important
+                for gap in gaps:
+                    report(f"         • Lacune : {gap}")
+                return gaps
+
+        report(f"      ⚠ Impossible d'extraire les lacunes de la réponse : {last_error or 'aucun tableau JSON'}")
+        return []
     
     def _fill_gaps(self, subject, gaps, existing_sources):
-        """Fill identified gaps using RAG queries."""
+        """Fill identified gaps using RAG queries, issued concurrently."""
         enhancements = []
-        source_id_start = max([s['id'] for s in existing_sources]) + 1 if existing_sources else 1
-        
-        for gap in gaps:
-            # Query RAG for this gap
-            knowledge_base, sources = context_from_query(gap, top_k=self.top_k)
-            
+
+        if not gaps:
+            return enhancements
+
+        # Query RAG for all gaps at once; results come back in gap order
+        with ThreadPoolExecutor(max_workers=len(gaps)) as pool:
+            results = list(pool.map(lambda gap: context_from_query(gap, top_k=self.top_k), gaps))
+
+        for gap, (knowledge_base, sources) in zip(gaps, results):
             # Re-number sources
             for source in sources:
                 source['original_id'] = source['id']
-                source['id'] = source_id_start
-                source_id_start += 1
+                source['id'] = self._next_source_id
+                self._next_source_id += 1
                 self.enhancement_sources.append(source)
             
             enhancements.append({
@@ -133,10 +150,10 @@ CITATION RULES:
 - Use separate brackets for multiple sources: [SOURCE 1] [SOURCE 2]
 - NEVER use comma-separated sources: [SOURCE 1, 2]"""
 
-        enhancement_text = []
-        for enh in enhancements:
-            enhancement_text.append(f"=== Gap: {enh['gap']} ===\n{enh['knowledge']}")
-        
+        enhancement_text = "\n".join(
+            f"=== Gap: {enh['gap']} ===\n{enh['knowledge']}" for enh in enhancements
+        )
+
         user_prompt = f"""Subject: {subject}
 
 <current_knowledge>
@@ -144,7 +161,7 @@ CITATION RULES:
 </current_knowledge>
 
 <new_information>
-{chr(10).join(enhancement_text)}
+{enhancement_text}
 </new_information>
 
 Integrate the new information into the current knowledge base.
@@ -153,7 +170,7 @@ Keep all existing citations and add new ones for the new information.
 
 Return the complete updated knowledge base."""
 
-        integrated = call_llm(system_prompt, user_prompt)
+        integrated = call_llm_cached(system_prompt, user_prompt)
         
         # Add citation links
         integrated_with_links, _ = add_citation_links(integrated, all_sources + self.enhancement_sources)
@@ -1,5 +1,28 @@
-from .utils import context_from_query, call_llm, add_citation_links
-import json
+from .utils import context_from_query, call_llm, add_citation_links, parse_json_response, report
+from concurrent.futures import ThreadPoolExecutor
+import contextvars
+
+# The LLM decides how many queries come back: bound the retrieval fan-out
+MAX_RETRIEVAL_WORKERS = 16
+
+# Fixed system prompts: byte-identical on every call, so the LLM runtime can
+# reuse the prefix it already processed (Ollama keeps it while the model is loaded)
+SEARCH_QUERIES_SYSTEM_PROMPT = """You are an expert research assistant.
+Your task is to generate comprehensive search queries to gather all relevant knowledge about a subject.
+
+IMPORTANT: You must respond in French."""
+
+SYNTHESIZE_SYSTEM_PROMPT = """You are an expert knowledge synthesizer.
+
+IMPORTANT: You must respond in French.
+
+Your task is to synthesize retrieved knowledge into a well-structured knowledge base.
+Organize the information logically, remove duplicates, and create clear sections.
+
+CITATION RULES:
+- Cite sources using [SOURCE X] format
+- Use separate brackets for multiple sources: [SOURCE 1] [SOURCE 2]
+- NEVER use comma-separated sources: [SOURCE 1, 2]"""
 
 
 class KnowledgeRetrieverAgent:
@@ -14,10 +37,7 @@ class KnowledgeRetrieverAgent:
         
     def generate_search_queries(self, subject):
         """Generate multiple search queries to cover the subject comprehensively."""
-        system_prompt = """You are an expert research assistant.
-Your task is to generate comprehensive search queries to gather all relevant knowledge about a subject.
-
-IMPORTANT: You must respond in French."""
+        system_prompt = SEARCH_QUERIES_SYSTEM_PROMPT
 
         user_prompt = f"""Subject: {subject}
 
@@ -37,37 +57,44 @@ Example format: ["query 1", "query 2", "query 3"]"""
 
         response = call_llm(system_prompt, user_prompt)
         
-        # Extract JSON from response
+        # Extract the JSON array from response (prose, fences and trailing commas tolerated)
         try:
-            start = response.find('[')
-            end = response.rfind(']') + 1
-            queries = json.loads(response[start:end])
-            return queries
-        except:
-            # Fallback: basic queries
-            return [
-                subject,
-                f"{subject} concepts fondamentaux",
-                f"{subject} principes",
-                f"{subject} applications pratiques",
-                f"{subject} techniques avancées"
-            ]
+            queries = [query for query in parse_json_response(response, brackets='[]') if isinstance(query, str) and query]
+            if queries:
+                return queries
+        except ValueError:
+            pass
+        # Fallback: basic queries
+        return [
+            subject,
+            f"{subject} concepts fondamentaux",
+            f"{subject} principes",
+            f"{subject} applications pratiques",
+            f"{subject} techniques avancées"
+        ]
     
     def retrieve_knowledge(self, subject):
         """Retrieve and structure knowledge from multiple queries."""
-        print(f"📚 Agent 1 : Collecte des connaissances sur '{subject}'...")
+        report(f"📚 Agent 1 : Collecte des connaissances sur '{subject}'...")
+
+        with ThreadPoolExecutor(max_workers=MAX_RETRIEVAL_WORKERS) as pool:
+            # Generate diverse queries while a broad retrieval on the subject itself runs
+            queries_future = pool.submit(contextvars.copy_context().run, self.generate_search_queries, subject)
+            broad_future = pool.submit(context_from_query, subject, top_k=self.top_k_per_query * 2)
 
-        # Generate diverse queries
-        queries = self.generate_search_queries(subject)
-        print(f"   {len(queries)} requêtes de recherche générées")
+            queries = [query for query in queries_future.result() if query != subject]
+            report(f"   {len(queries)} requêtes de recherche générées")
+
+            # Retrieve knowledge for all queries concurrently; results come back in query order
+            results = [broad_future.result()]
+            results.extend(pool.map(lambda query: context_from_query(query, top_k=self.top_k_per_query), queries))
+        queries.insert(0, subject)
 
-        # Retrieve knowledge for each query
         all_knowledge = []
         source_id_counter = 1
 
-        for idx, query in enumerate(queries, 1):
-            print(f"   Requête {idx}/{len(queries)} : {query[:60]}...")
-            knowledge_base, sources = context_from_query(query, top_k=self.top_k_per_query)
+        for idx, (query, (knowledge_base, sources)) in enumerate(zip(queries, results), 1):
+            report(f"   Requête {idx}/{len(queries)} : {query[:60]}...")
 
             # Re-number sources to avoid conflicts
             for source in sources:
@@ -76,7 +103,7 @@ Example format: ["query 1", "query 2", "query 3"]"""
                 source_id_counter += 1
                 self.all_sources.append(source)
 
-            print(f"      ✓ {len(sources)} sources trouvées")
+            report(f"      ✓ {len(sources)} sources trouvées")
 
             all_knowledge.append({
                 'query': query,
@@ -87,22 +114,12 @@ Example format: ["query 1", "query 2", "query 3"]"""
         # Synthesize all knowledge
         synthesized = self._synthesize_knowledge(subject, all_knowledge)
 
-        print(f"✅ Agent 1 : Connaissances récupérées depuis {len(self.all_sources)} sources")
+        report(f"✅ Agent 1 : Connaissances récupérées depuis {len(self.all_sources)} sources")
         return synthesized, self.all_sources
     
     def _synthesize_knowledge(self, subject, all_knowledge):
         """Synthesize retrieved knowledge into structured format."""
-        system_prompt = """You are an expert knowledge synthesizer.
-
-IMPORTANT: You must respond in French.
-
-Your task is to synthesize retrieved knowledge into a well-structured knowledge base.
-Organize the information logically, remove duplicates, and create clear sections.
-
-CITATION RULES:
-- Cite sources using [SOURCE X] format
-- Use separate brackets for multiple sources: [SOURCE 1] [SOURCE 2]
-- NEVER use comma-separated sources: [SOURCE 1, 2]"""
+        system_prompt = SYNTHESIZE_SYSTEM_PROMPT
 
         # Build comprehensive knowledge base
         knowledge_sections = []
@@ -1,9 +1,11 @@
 from course_build_agents.knowledge_retriever import KnowledgeRetrieverAgent
 from course_build_agents.knowledge_enhancer import KnowledgeEnhancerAgent
 from course_build_agents.course_generator import CourseGeneratorAgent
-import json
 import os
-from datetime import datetime
+import shutil
+import time
+from pathlib import Path
+import orjson
 
 
 class MultiAgentOrchestrator:
@@ -59,7 +61,7 @@ class MultiAgentOrchestrator:
         print(f"Subject: {subject}")
         print("=" * 80)
         
-        start_time = datetime.now()
+        start_time = time.perf_counter()
         
         # AGENT 1: Knowledge Retrieval
         print("\n" + "=" * 80)
@@ -70,7 +72,7 @@ class MultiAgentOrchestrator:
         self.results['initial_source_count'] = len(sources)
         
         # Save initial knowledge
-        self._save_knowledge(knowledge_base, sources, 'initial_knowledge.md')
+        initial_path = self._save_knowledge(knowledge_base, sources, 'initial_knowledge.md')
         
         # AGENT 2: Knowledge Enhancement
         print("\n" + "=" * 80)
@@ -83,8 +85,12 @@ class MultiAgentOrchestrator:
         self.results['final_source_count'] = len(all_sources)
         self.results['sources_added'] = len(all_sources) - len(sources)
         
-        # Save enhanced knowledge
-        self._save_knowledge(enhanced_knowledge, all_sources, 'enhanced_knowledge.md')
+        # Save enhanced knowledge (a plain copy when the enhancer added nothing)
+        unchanged = enhanced_knowledge == knowledge_base and len(all_sources) == len(sources)
+        self._save_knowledge(
+            enhanced_knowledge, all_sources, 'enhanced_knowledge.md',
+            base_path=initial_path if unchanged else None
+        )
         
         # AGENT 3: Course Generation
         print("\n" + "=" * 80)
@@ -102,8 +108,7 @@ class MultiAgentOrchestrator:
         self._save_json_results()
         
         # Summary
-        end_time = datetime.now()
-        duration = (end_time - start_time).total_seconds()
+        duration = time.perf_counter() - start_time
         
         print("\n" + "=" * 80)
         print("PROCESS COMPLETED")
@@ -119,19 +124,26 @@ class MultiAgentOrchestrator:
         
         return self.results
     
-    def _save_knowledge(self, knowledge, sources, filename):
-        """Save knowledge base with sources to markdown file."""
+    def _save_knowledge(self, knowledge, sources, filename, base_path=None):
+        """
+        Save knowledge base with sources to markdown file.
+
+        base_path: an already saved file with the same knowledge and sources,
+        copied as is instead of rendering the markdown again.
+        """
         filepath = os.path.join(self.output_dir, filename)
-        
-        with open(filepath, 'w', encoding='utf-8') as f:
-            f.write(f"# Knowledge Base\n\n")
-            f.write(knowledge)
-            f.write("\n\n---\n\n")
-            f.write("## Sources\n\n")
-            for i, source in enumerate(sources, 1):
-                f.write(f"{i}. [{source['title']}]({source['url']})\n")
-        
+
+        if base_path:
+            shutil.copyfile(base_path, filepath)
+        else:
+            source_lines = "".join(f"{i}. [{source['title']}]({source['url']})\n" for i, source in enumerate(sources, 1))
+            Path(filepath).write_text(
+                f"# Knowledge Base\n\n{knowledge}\n\n---\n\n## Sources\n\n{source_lines}",
+                encoding='utf-8'
+            )
+
         print(f"   Saved: {filepath}")
+        return filepath
     
     def _save_json_results(self):
         """Save complete results as JSON for programmatic access."""
@@ -153,9 +165,10 @@ class MultiAgentOrchestrator:
             ]
         }
         
-        with open(filepath, 'w', encoding='utf-8') as f:
-            json.dump(json_results, f, ensure_ascii=False, indent=2)
-        
+        Path(filepath).write_bytes(
+            orjson.dumps(json_results, option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS)
+        )
+
         print(f"   Saved: {filepath}")
 
 
@@ -1,207 +1,180 @@
 from course_build_agents.knowledge_retriever import KnowledgeRetrieverAgent
 from course_build_agents.knowledge_enhancer import KnowledgeEnhancerAgent
 from course_build_agents.course_generator import CourseGeneratorAgent
-import json
+from course_build_agents.utils import run_logger, report, console_handler
+import asyncio
+import contextvars
 import os
-import sys
+import shutil
+import time
 import logging
+from logging.handlers import MemoryHandler
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
-from io import StringIO
-
-
-class StreamingPrintCapture:
-    """Captures print statements in a buffer for later retrieval."""
-    def __init__(self):
-        self.original_stdout = sys.stdout
-        self.buffer = []
-
-    def write(self, text):
-        # Write to original stdout
-        self.original_stdout.write(text)
-        # Capture in buffer
-        self.buffer.append(text)
-
-    def flush(self):
-        self.original_stdout.flush()
-
-    def get_and_clear(self):
-        """Get captured content and clear buffer."""
-        content = ''.join(self.buffer)
-        self.buffer = []
-        return content
-
-
-def stream_course_generation_progress(subject, config=None):
+from pathlib import Path
+import orjson
+
+# Section banners, built once
+_BAR = "=" * 80
+_PHASE1_HDR = f"\n{_BAR}\nPHASE 1: KNOWLEDGE RETRIEVAL\n{_BAR}"
+_PHASE2_HDR = f"\n{_BAR}\nPHASE 2: KNOWLEDGE ENHANCEMENT\n{_BAR}"
+_PHASE3_HDR = f"\n{_BAR}\nPHASE 3: COURSE STRUCTURE GENERATION\n{_BAR}"
+_MARKDOWN_HDR = f"\n{_BAR}\nGENERATING COURSE MARKDOWN\n{_BAR}"
+_COMPLETED_HDR = f"\n{_BAR}\nPROCESS COMPLETED SUCCESSFULLY\n{_BAR}"
+_FR_PHASE1_HDR = f"\n{_BAR}\nPHASE 1: RÉCUPÉRATION DES CONNAISSANCES\n{_BAR}"
+_FR_PHASE2_HDR = f"\n{_BAR}\nPHASE 2: AMÉLIORATION DES CONNAISSANCES\n{_BAR}"
+_FR_PHASE3_HDR = f"\n{_BAR}\nPHASE 3: GÉNÉRATION DE LA STRUCTURE DU COURS\n{_BAR}"
+_FR_MARKDOWN_HDR = f"\n{_BAR}\nGÉNÉRATION DU MARKDOWN\n{_BAR}"
+_FR_COMPLETED_TITLE = f"\n{_BAR}\nPROCESSUS TERMINÉ AVEC SUCCÈS"
+
+
+class QueueEventHandler(logging.Handler):
+    """Forwards log records to an asyncio.Queue as progress events, from any thread."""
+    def __init__(self, loop, queue):
+        super().__init__()
+        self.loop = loop
+        self.queue = queue
+
+    def put(self, event):
+        # Agents run in worker threads: hand the event over to the event loop
+        self.loop.call_soon_threadsafe(self.queue.put_nowait, event)
+
+    def emit(self, record):
+        self.put({'type': 'progress', 'content': f"{self.format(record)}\n"})
+
+
+async def stream_course_generation_progress(subject, config=None):
     """
     Stream course generation with progress updates.
     Yields progress messages that can be sent as reasoning_content.
 
+    The agents log their progress to a per-run logger (see utils.run_logger) whose
+    QueueEventHandler feeds this generator while each blocking phase runs in a
+    worker thread via asyncio.to_thread, so every message is yielded as soon as
+    it is logged instead of at the end of its phase.
+
     Yields:
         dict: {'type': 'progress'|'complete', 'content': str, 'results': dict}
     """
     config = config or {}
 
-    # Setup print capture
-    capture = StreamingPrintCapture()
-    old_stdout = sys.stdout
-    sys.stdout = capture
+    events = asyncio.Queue()
+    handler = QueueEventHandler(asyncio.get_running_loop(), events)
 
-    try:
-        retriever = KnowledgeRetrieverAgent(
-            top_k_per_query=config.get('retriever_top_k', 5)
-        )
-        enhancer = KnowledgeEnhancerAgent(
-            max_iterations=config.get('enhancer_iterations', 3),
-            top_k=config.get('enhancer_top_k', 5)
-        )
-        course_generator = CourseGeneratorAgent()
-
-        # Phase 1: Knowledge Retrieval
-        print("=" * 80)
-        print(f"GÉNÉRATION DE COURS MULTI-AGENTS")
-        print(f"Sujet: {subject}")
-        print(f"Démarré à: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
-        print("=" * 80)
-        print("\n" + "=" * 80)
-        print("PHASE 1: RÉCUPÉRATION DES CONNAISSANCES")
-        print("=" * 80)
-
-        # Yield header
-        header = capture.get_and_clear()
-        if header:
-            yield {'type': 'progress', 'content': header}
-
-        knowledge_base, sources = retriever.retrieve_knowledge(subject)
-
-        # Yield retrieval logs
-        retrieval_logs = capture.get_and_clear()
-        if retrieval_logs:
-            yield {'type': 'progress', 'content': retrieval_logs}
-
-        # Phase 2: Knowledge Enhancement
-        print("\n" + "=" * 80)
-        print("PHASE 2: AMÉLIORATION DES CONNAISSANCES")
-        print("=" * 80)
-
-        phase2_header = capture.get_and_clear()
-        if phase2_header:
-            yield {'type': 'progress', 'content': phase2_header}
-
-        enhanced_knowledge, all_sources = enhancer.enhance_knowledge(
-            subject, knowledge_base, sources
-        )
+    # Logger of this run only (not registered with logging.getLogger, so nothing outlives the run)
+    logger = logging.Logger('CourseGenerator', logging.INFO)
+    logger.addHandler(console_handler)
+    logger.addHandler(handler)
+    log = logger.info
 
-        # Yield enhancement logs
-        enhancement_logs = capture.get_and_clear()
-        if enhancement_logs:
-            yield {'type': 'progress', 'content': enhancement_logs}
+    async def generate():
+        # The task runs in its own copy of the context, which asyncio.to_thread hands to the agents
+        run_logger.set(logger)
 
-        sources_added = len(all_sources) - len(sources)
+        try:
+            retriever = KnowledgeRetrieverAgent(
+                top_k_per_query=config.get('retriever_top_k', 5)
+            )
+            enhancer = KnowledgeEnhancerAgent(
+                max_iterations=config.get('enhancer_iterations', 3),
+                top_k=config.get('enhancer_top_k', 5)
+            )
+            course_generator = CourseGeneratorAgent()
 
-        # Phase 3: Course Generation
-        print("\n" + "=" * 80)
-        print("PHASE 3: GÉNÉRATION DE LA STRUCTURE DU COURS")
-        print("=" * 80)
+            # Phase 1: Knowledge Retrieval
+            log(_BAR)
+            log(f"GÉNÉRATION DE COURS MULTI-AGENTS")
+            log(f"Sujet: {subject}")
+            log(f"Démarré à: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
+            log(_BAR)
+            log(_FR_PHASE1_HDR)
 
-        phase3_header = capture.get_and_clear()
-        if phase3_header:
-            yield {'type': 'progress', 'content': phase3_header}
+            knowledge_base, sources = await asyncio.to_thread(retriever.retrieve_knowledge, subject)
 
-        course_structure = course_generator.generate_course(
-            subject, enhanced_knowledge, all_sources
-        )
+            # Phase 2: Knowledge Enhancement
+            log(_FR_PHASE2_HDR)
 
-        # Yield course generation logs
-        generation_logs = capture.get_and_clear()
-        if generation_logs:
-            yield {'type': 'progress', 'content': generation_logs}
-
-        # Generate markdown
-        print("\n" + "=" * 80)
-        print("GÉNÉRATION DU MARKDOWN")
-        print("=" * 80)
-        print(f"   Génération du contenu markdown...")
-
-        markdown_header = capture.get_and_clear()
-        if markdown_header:
-            yield {'type': 'progress', 'content': markdown_header}
-
-        course_markdown = course_generator.get_markdown_content()
-
-        print(f"   ✓ Markdown généré ({len(course_markdown)} caractères)")
-        print("\n" + "=" * 80)
-        print("PROCESSUS TERMINÉ AVEC SUCCÈS")
-        print(f"Chapitres: {course_structure.get('total_chapters', 0)}")
-        print(f"Sources: {len(all_sources)} (dont {sources_added} ajoutées)")
-        print("=" * 80)
-
-        final_logs = capture.get_and_clear()
-        if final_logs:
-            yield {'type': 'progress', 'content': final_logs}
-
-        # Return final results
-        results = {
-            'course_structure': course_structure,
-            'course_markdown': course_markdown,
-            'initial_source_count': len(sources),
-            'final_source_count': len(all_sources),
-            'sources_added': sources_added
-        }
+            enhanced_knowledge, all_sources = await asyncio.to_thread(
+                enhancer.enhance_knowledge, subject, knowledge_base, sources
+            )
+
+            sources_added = len(all_sources) - len(sources)
+
+            # Phase 3: Course Generation
+            log(_FR_PHASE3_HDR)
+
+            course_structure = await asyncio.to_thread(
+                course_generator.generate_course, subject, enhanced_knowledge, all_sources
+            )
 
-        yield {'type': 'complete', 'content': '', 'results': results}
+            # Generate markdown
+            log(_FR_MARKDOWN_HDR)
+            log(f"   Génération du contenu markdown...")
+
+            course_markdown = course_generator.get_markdown_content()
+
+            log(f"   ✓ Markdown généré ({len(course_markdown)} caractères)")
+            log(_FR_COMPLETED_TITLE)
+            log(f"Chapitres: {course_structure.get('total_chapters', 0)}")
+            log(f"Sources: {len(all_sources)} (dont {sources_added} ajoutées)")
+            log(_BAR)
+
+            # Return final results
+            results = {
+                'course_structure': course_structure,
+                'course_markdown': course_markdown,
+                'initial_source_count': len(sources),
+                'final_source_count': len(all_sources),
+                'sources_added': sources_added
+            }
+
+            # Goes through the same hand-over as the progress events, so it arrives last
+            handler.put({'type': 'complete', 'content': '', 'results': results})
+
+        except Exception as e:
+            handler.put({'type': 'error', 'error': e})
+
+    task = asyncio.create_task(generate())
+
+    try:
+        while True:
+            event = await events.get()
+            if event['type'] == 'error':
+                raise event['error']
+            yield event
+            if event['type'] == 'complete':
+                break
 
     finally:
-        # Restore stdout
-        sys.stdout = old_stdout
+        # The consumer may stop early: don't leave the generation task behind
+        task.cancel()
 
 
 class LogCapture:
-    """Captures both print statements and logging to a file and memory."""
+    """Writes the records of a run logger to a log file, in batches."""
 
     def __init__(self, log_file_path):
         self.log_file_path = log_file_path
-        self.log_buffer = StringIO()
-        self.terminal = sys.stdout
 
-        # Setup file logger
+        # Setup file handler
         self.file_handler = logging.FileHandler(log_file_path, mode='w', encoding='utf-8')
         self.file_handler.setLevel(logging.INFO)
         formatter = logging.Formatter('%(asctime)s - %(message)s', datefmt='%Y-%m-%d %H:%M:%S')
         self.file_handler.setFormatter(formatter)
 
-        # Create logger
-        self.logger = logging.getLogger('CourseGenerator')
-        self.logger.setLevel(logging.INFO)
-        self.logger.addHandler(self.file_handler)
-
-    def write(self, message):
-        """Intercept stdout writes."""
-        self.terminal.write(message)
-        self.log_buffer.write(message)
-        # Also write to file, removing ANSI codes
-        clean_message = self._remove_ansi(message)
-        if clean_message.strip():
-            self.logger.info(clean_message.rstrip())
-
-    def flush(self):
-        """Flush both outputs."""
-        self.terminal.flush()
-        self.log_buffer.flush()
-
-    def _remove_ansi(self, text):
-        """Remove ANSI escape codes from text."""
-        import re
-        ansi_escape = re.compile(r'\x1B(?:[@-Z\\-_]|\[[0-?]*[ -/]*[@-~])')
-        return ansi_escape.sub('', text)
+        # Buffer records and write them to the file in batches
+        self.handler = MemoryHandler(capacity=1024, flushLevel=logging.ERROR, target=self.file_handler)
 
     def get_logs(self):
-        """Get all captured logs as string."""
-        return self.log_buffer.getvalue()
+        """Get all captured logs as string, read back from the log file."""
+        self.handler.flush()
+        with open(self.log_file_path, encoding='utf-8') as f:
+            return f.read()
 
     def close(self):
-        """Close file handler."""
+        """Flush buffered records and close the handlers."""
+        self.handler.close()
         self.file_handler.close()
-        self.logger.removeHandler(self.file_handler)
 
 
 class MultiAgentOrchestratorWithLogging:
@@ -245,6 +218,7 @@ class MultiAgentOrchestratorWithLogging:
         self.results = {}
         self.enable_logging = config.get('enable_logging', True)
         self.log_capture = None
+        self._io_pool = None
 
     def run(self, subject):
         """
@@ -256,26 +230,33 @@ class MultiAgentOrchestratorWithLogging:
         Returns:
             dict: Complete results including knowledge base, course structure, and log file path
         """
-        # Setup logging
+        start_time = time.perf_counter()
+        started_at = datetime.now()
+
+        # Setup logging: agents report to this run's logger through utils.run_logger
+        self.logger = logging.Logger('CourseGenerator', logging.INFO)
+        self.logger.addHandler(console_handler)
         if self.enable_logging:
-            log_file_path = os.path.join(self.output_dir, f'course_generation_log_{datetime.now().strftime("%Y%m%d_%H%M%S")}.txt')
+            log_file_path = os.path.join(self.output_dir, f'course_generation_log_{started_at.strftime("%Y%m%d_%H%M%S")}.txt')
             self.log_capture = LogCapture(log_file_path)
-            old_stdout = sys.stdout
-            sys.stdout = self.log_capture
+            self.logger.addHandler(self.log_capture.handler)
+            self.results['log_file_path'] = log_file_path
+        logger_token = run_logger.set(self.logger)
+        log = self.logger.info
 
-        try:
-            print("=" * 80)
-            print(f"MULTI-AGENT COURSE GENERATION SYSTEM")
-            print(f"Subject: {subject}")
-            print(f"Started at: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
-            print("=" * 80)
+        pending_writes = []
+        # Output files are written in the background, off the LLM critical path
+        self._io_pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix='course-io')
 
-            start_time = datetime.now()
+        try:
+            log(_BAR)
+            log(f"MULTI-AGENT COURSE GENERATION SYSTEM")
+            log(f"Subject: {subject}")
+            log(f"Started at: {started_at.strftime('%Y-%m-%d %H:%M:%S')}")
+            log(_BAR)
 
             # AGENT 1: Knowledge Retrieval
-            print("\n" + "=" * 80)
-            print("PHASE 1: KNOWLEDGE RETRIEVAL")
-            print("=" * 80)
+            log(_PHASE1_HDR)
             knowledge_base, sources = self.retriever.retrieve_knowledge(subject)
 
             self.results['initial_knowledge'] = knowledge_base
@@ -283,12 +264,11 @@ class MultiAgentOrchestratorWithLogging:
             self.results['initial_source_count'] = len(sources)
 
             # Save initial knowledge
-            self._save_knowledge(knowledge_base, sources, 'initial_knowledge.md')
+            initial_save = self._submit_io(self._save_knowledge, knowledge_base, sources, 'initial_knowledge.md')
+            pending_writes.append(initial_save)
 
             # AGENT 2: Knowledge Enhancement
-            print("\n" + "=" * 80)
-            print("PHASE 2: KNOWLEDGE ENHANCEMENT")
-            print("=" * 80)
+            log(_PHASE2_HDR)
             enhanced_knowledge, all_sources = self.enhancer.enhance_knowledge(
                 subject, knowledge_base, sources
             )
@@ -298,72 +278,100 @@ class MultiAgentOrchestratorWithLogging:
             self.results['final_source_count'] = len(all_sources)
             self.results['sources_added'] = len(all_sources) - len(sources)
 
-            # Save enhanced knowledge
-            self._save_knowledge(enhanced_knowledge, all_sources, 'enhanced_knowledge.md')
+            # Save enhanced knowledge (a plain copy when the enhancer added nothing)
+            unchanged = enhanced_knowledge == knowledge_base and len(all_sources) == len(sources)
+            pending_writes.append(self._submit_io(
+                lambda: self._save_knowledge(
+                    enhanced_knowledge, all_sources, 'enhanced_knowledge.md',
+                    base_path=initial_save.result() if unchanged else None
+                )
+            ))
 
             # AGENT 3: Course Generation
-            print("\n" + "=" * 80)
-            print("PHASE 3: COURSE STRUCTURE GENERATION")
-            print("=" * 80)
+            log(_PHASE3_HDR)
             course_structure = self.course_generator.generate_course(
                 subject, enhanced_knowledge, all_sources
             )
 
             self.results['course_structure'] = course_structure
 
+            # Build the Word document in the background while the markdown is generated
+            docx_future = None
+            if self.enable_logging:
+                docx_path = os.path.join(self.output_dir, 'course_structure.docx')
+                docx_future = self._submit_io(self._export_to_word, course_structure, all_sources, docx_path)
+
             # Generate markdown content
-            print("\n" + "=" * 80)
-            print("GENERATING COURSE MARKDOWN")
-            print("=" * 80)
+            log(_MARKDOWN_HDR)
             course_markdown = self.course_generator.get_markdown_content()
-            print(f"   Markdown content generated ({len(course_markdown)} characters)")
+            log(f"   Markdown content generated ({len(course_markdown)} characters)")
 
             # Optionally save markdown to file if logging is enabled
             if self.enable_logging:
                 course_md_path = os.path.join(self.output_dir, 'course_structure.md')
-                self.course_generator.export_to_markdown(course_md_path)
+                pending_writes.append(self._submit_io(self.course_generator.export_to_markdown, course_md_path))
 
             # Summary
-            end_time = datetime.now()
-            duration = (end_time - start_time).total_seconds()
-
-            print("\n" + "=" * 80)
-            print("PROCESS COMPLETED SUCCESSFULLY")
-            print("=" * 80)
-            print(f"Subject: {subject}")
-            print(f"Initial sources: {self.results['initial_source_count']}")
-            print(f"Sources added by enhancer: {self.results['sources_added']}")
-            print(f"Total sources: {self.results['final_source_count']}")
-            print(f"Total chapters: {course_structure.get('total_chapters', 0)}")
-            print(f"Duration: {duration:.2f} seconds")
+            duration = time.perf_counter() - start_time
+
+            log(_COMPLETED_HDR)
+            log(f"Subject: {subject}")
+            log(f"Initial sources: {self.results['initial_source_count']}")
+            log(f"Sources added by enhancer: {self.results['sources_added']}")
+            log(f"Total sources: {self.results['final_source_count']}")
+            log(f"Total chapters: {course_structure.get('total_chapters', 0)}")
+            log(f"Duration: {duration:.2f} seconds")
             if self.enable_logging:
-                print(f"\nOutput directory: {self.output_dir}")
-            print("=" * 80)
+                log(f"\nOutput directory: {self.output_dir}")
+            log(_BAR)
 
             # Add markdown content to results
             self.results['course_markdown'] = course_markdown
 
+            # Wait for the background writes before handing back the results
+            for future in pending_writes:
+                future.result()
+
+            if docx_future:
+                try:
+                    self.results['course_docx_path'] = docx_future.result()
+                except Exception as e:
+                    log(f"   Warning: Word export failed: {e}")
+
             return self.results
 
         finally:
-            # Restore stdout and close logging
+            # Let pending writes finish (even if the run failed) before their log is closed
+            self._io_pool.shutdown(wait=True)
+            # Restore the previous logger and close logging
+            run_logger.reset(logger_token)
             if self.enable_logging:
-                sys.stdout = old_stdout
                 self.log_capture.close()
 
-    def _save_knowledge(self, knowledge, sources, filename):
-        """Save knowledge base with sources to markdown file."""
+    def _submit_io(self, fn, *args):
+        """Run fn on the I/O pool in a copy of the current context, so it reports to this run's logger."""
+        return self._io_pool.submit(contextvars.copy_context().run, fn, *args)
+
+    def _save_knowledge(self, knowledge, sources, filename, base_path=None):
+        """
+        Save knowledge base with sources to markdown file.
+
+        base_path: an already saved file with the same knowledge and sources,
+        copied as is instead of rendering the markdown again.
+        """
         filepath = os.path.join(self.output_dir, filename)
 
-        with open(filepath, 'w', encoding='utf-8') as f:
-            f.write(f"# Knowledge Base\n\n")
-            f.write(knowledge)
-            f.write("\n\n---\n\n")
-            f.write("## Sources\n\n")
-            for i, source in enumerate(sources, 1):
-                f.write(f"{i}. [{source['title']}]({source['url']})\n")
+        if base_path:
+            shutil.copyfile(base_path, filepath)
+        else:
+            source_lines = "".join(f"{i}. [{source['title']}]({source['url']})\n" for i, source in enumerate(sources, 1))
+            Path(filepath).write_text(
+                f"# Knowledge Base\n\n{knowledge}\n\n---\n\n## Sources\n\n{source_lines}",
+                encoding='utf-8'
+            )
 
-        print(f"   Saved: {filepath}")
+        report(f"   Saved: {filepath}")
+        return filepath
 
     def _save_json_results(self):
         """Save complete results as JSON for programmatic access."""
@@ -385,19 +393,25 @@ class MultiAgentOrchestratorWithLogging:
             ]
         }
 
-        with open(filepath, 'w', encoding='utf-8') as f:
-            json.dump(json_results, f, ensure_ascii=False, indent=2)
+        Path(filepath).write_bytes(
+            orjson.dumps(json_results, option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS)
+        )
 
-        print(f"   Saved: {filepath}")
+        report(f"   Saved: {filepath}")
 
     def _export_to_word(self, course_structure, sources, output_path):
         """Export course structure to a professionally formatted Word document."""
+        # Nothing to export: don't pay for importing python-docx
+        if not course_structure.get('chapters'):
+            report(f"   No chapters to export, Word document skipped")
+            return None
+
         from docx import Document
         from docx.shared import Pt, Inches, RGBColor
         from docx.enum.text import WD_ALIGN_PARAGRAPH
         from docx.enum.style import WD_STYLE_TYPE
 
-        print(f"   Generating Word document...")
+        report(f"   Generating Word document...")
 
         doc = Document()
 
@@ -407,6 +421,13 @@ class MultiAgentOrchestratorWithLogging:
         font.name = 'Calibri'
         font.size = Pt(11)
 
+        # Resolve list styles once instead of by name on every paragraph
+        list_number = doc.styles['List Number']
+        list_bullet = doc.styles['List Bullet']
+        list_bullet_2 = doc.styles['List Bullet 2']
+
+        chapters = list(enumerate(course_structure['chapters'], 1))
+
         # Title
         title = doc.add_heading(course_structure['course_title'], level=0)
         title.alignment = WD_ALIGN_PARAGRAPH.CENTER
@@ -429,18 +450,18 @@ class MultiAgentOrchestratorWithLogging:
 
         # Table of Contents
         doc.add_heading('Table des matières', level=1)
-        for idx, chapter in enumerate(course_structure['chapters'], 1):
-            toc_para = doc.add_paragraph(style='List Number')
+        for idx, chapter in chapters:
+            toc_para = doc.add_paragraph(style=list_number)
             toc_para.add_run(chapter['title'])
             if 'subchapters' in chapter:
                 for sub_idx, subchapter in enumerate(chapter['subchapters'], 1):
-                    sub_para = doc.add_paragraph(style='List Bullet 2')
+                    sub_para = doc.add_paragraph(style=list_bullet_2)
                     sub_para.add_run(f"{idx}.{sub_idx} {subchapter['title']}")
 
         doc.add_page_break()
 
         # Chapters
-        for ch_idx, chapter in enumerate(course_structure['chapters'], 1):
+        for ch_idx, chapter in chapters:
             # Chapter heading
             doc.add_heading(f"Chapitre {ch_idx}: {chapter['title']}", level=1)
 
@@ -451,7 +472,7 @@ class MultiAgentOrchestratorWithLogging:
             if 'learning_objectives' in chapter and chapter['learning_objectives']:
                 doc.add_heading('Objectifs d\'apprentissage', level=2)
                 for obj in chapter['learning_objectives']:
-                    doc.add_paragraph(obj, style='List Bullet')
+                    doc.add_paragraph(obj, style=list_bullet)
 
             # Subchapters
             if 'subchapters' in chapter:
@@ -463,27 +484,28 @@ class MultiAgentOrchestratorWithLogging:
                     if 'content_to_cover' in subchapter and subchapter['content_to_cover']:
                         doc.add_heading('Contenu à couvrir:', level=3)
                         for content in subchapter['content_to_cover']:
-                            doc.add_paragraph(content, style='List Bullet')
+                            doc.add_paragraph(content, style=list_bullet)
 
                     # Practical elements
                     if 'practical_elements' in subchapter and subchapter['practical_elements']:
                         doc.add_heading('Éléments pratiques:', level=3)
                         for element in subchapter['practical_elements']:
-                            doc.add_paragraph(element, style='List Bullet')
+                            doc.add_paragraph(element, style=list_bullet)
 
             doc.add_page_break()
 
         # Sources/References
         doc.add_heading('Sources et références', level=1)
         for idx, source in enumerate(sources, 1):
-            source_para = doc.add_paragraph(style='List Number')
+            source_para = doc.add_paragraph(style=list_number)
             source_para.add_run(f"{source['title']}")
             if source.get('url'):
                 source_para.add_run(f"\n   URL: {source['url']}")
 
         # Save document
         doc.save(output_path)
-        print(f"   Course Word document saved: {output_path}")
+        report(f"   Course Word document saved: {output_path}")
+        return output_path
 
 
 def main():
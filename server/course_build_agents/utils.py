@@ -1,89 +1,137 @@
 from retrivers.hybrid_retriever import retrieve
 import os
-import ollama
-from ollama import Client
+import functools
+import httpx
+from ollama import Client, ResponseError
 import re
-import json
+import logging
+import orjson
 import sys
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from contextvars import ContextVar
 from pathlib import Path
 
 # Add parent directory to path to import config
 sys.path.insert(0, str(Path(__file__).parent.parent))
 from config_loader import settings
 
-# Create Ollama client: cloud if key exists, local otherwise
+# Keep-alive connection pool shared by every LLM call (agents call the LLM from several threads)
+OLLAMA_POOL_LIMITS = httpx.Limits(max_connections=32, max_keepalive_connections=32)
+
+# Create Ollama client once: cloud if key exists, local otherwise
 if os.environ.get("OLLAMA_API_KEY"):
     ollama_client = Client(
         host="https://ollama.com",
-        headers={"Authorization": f"Bearer {os.environ.get('OLLAMA_API_KEY')}"}
+        headers={"Authorization": f"Bearer {os.environ.get('OLLAMA_API_KEY')}"},
+        limits=OLLAMA_POOL_LIMITS
     )
     USE_CLOUD = True
 else:
-    ollama_client = Client(host=os.environ.get("OLLAMA_BASE_URL"))
+    ollama_client = Client(host=settings.OLLAMA_BASE_URL, limits=OLLAMA_POOL_LIMITS)
     USE_CLOUD = False
 
+# Progress messages go to the logger of the current run (set by the orchestrator);
+# outside of a run they are only shown on the console
+console_handler = logging.StreamHandler(sys.stdout)
+console_handler.setFormatter(logging.Formatter('%(message)s'))
+
+_default_logger = logging.getLogger('course_build_agents')
+_default_logger.setLevel(logging.INFO)
+_default_logger.addHandler(console_handler)
+_default_logger.propagate = False
+
+run_logger = ContextVar('run_logger', default=_default_logger)
+
+
+def report(message):
+    """Envoie un message de progression au logger du run en cours."""
+    run_logger.get().info(message)
+
+
+# Citations émises par le LLM : [SOURCE X] (casse libre, comme dans rag_engine).
+# Le motif commence par un '[' littéral, que re recherche directement : sur une
+# synthèse de 55K caractères, re.sub reste ~10x plus rapide que google-re2.
+_SOURCE_RE = re.compile(r'\[\s*SOURCE\s+(\d+)\s*\]', re.IGNORECASE)
+_FENCE_OPEN_RE = re.compile(r'^```(?:json)?\s*\n?')
+_FENCE_CLOSE_RE = re.compile(r'\n?```\s*$')
+_SINGLE_QUOTED_KEY_RE = re.compile(r"(?<=[{,])\s*'([^'\n]+)'\s*:")
+
+# In-process LRU of LLM responses, keyed by a digest of model + prompts
+LLM_CACHE_SIZE = 256
+_llm_cache = OrderedDict()
+_llm_cache_lock = threading.Lock()
 
 
 def context_from_query(query, top_k=5):
     """Récupère le contexte pertinent avec métadonnées pour citation."""
     results = retrieve(query, top_k=top_k)
     
-    knowledge_parts = []
-    sources = []
-    
-    for i, result in enumerate(results, 1):
-        source_url = result['metadata'].get('source_url', '')
-        title = result['metadata'].get('title', 'Document sans titre')
-        chunk_text = result['chunk_text']
-        
-        knowledge_parts.append(
-            f"<knowledge id=\"{i}\" title=\"{title}\" url=\"{source_url}\">\n"
-            f"{chunk_text}\n"
-            f"</knowledge>"
-        )
-        
-        sources.append({
+    sources = [
+        {
             'id': i,
-            'title': title,
-            'url': source_url
-        })
+            'title': result['metadata'].get('title', 'Document sans titre'),
+            'url': result['metadata'].get('source_url', '')
+        }
+        for i, result in enumerate(results, 1)
+    ]
     
-    knowledge_base = "\n\n".join(knowledge_parts)
+    knowledge_base = "\n\n".join(
+        f"<knowledge id=\"{source['id']}\" title=\"{source['title']}\" url=\"{source['url']}\">\n"
+        f"{result['chunk_text']}\n"
+        f"</knowledge>"
+        for source, result in zip(sources, results)
+    )
     return knowledge_base, sources
 
 
 def add_citation_links(text, sources):
-    """Convertit [SOURCE X] en citations séquentielles [1](url), [2](url)..."""
-    used_sources = re.findall(r'\[\s*SOURCE\s+(\d+)\s*\]', text)
-    used_sources_unique = sorted(set(map(int, used_sources)))
-    source_mapping = {old: new for new, old in enumerate(used_sources_unique, 1)}
+    """Convertit [SOURCE X] en citations séquentielles [1](url), [2](url)...
+
+    Les numéros sont attribués dans l'ordre de première apparition, en une seule
+    passe, et deux sources de même URL (non vide) partagent le même numéro ; un id
+    absent des sources est laissé tel quel (comme dans rag_engine).
+    """
+    url_by_id = {s['id']: s['url'] for s in sources}
+    source_mapping = {}
+    url_to_order = {}
     
     def replace_source(match):
         source_num = int(match.group(1))
-        if source_num in source_mapping:
-            sequential_num = source_mapping[source_num]
-            source_url = next((s['url'] for s in sources if s['id'] == source_num), '#')
-            return f'[{sequential_num}]({source_url})'
-        return match.group(0)
+        if source_num not in url_by_id:
+            return match.group(0)
+        source_url = url_by_id[source_num]
+        if source_num not in source_mapping:
+            key = source_url or ('id', source_num)
+            source_mapping[source_num] = url_to_order.setdefault(key, len(url_to_order) + 1)
+        return f'[{source_mapping[source_num]}]({source_url})'
     
-    text = re.sub(r'\[\s*SOURCE\s+(\d+)\s*\]', replace_source, text)
+    text = _SOURCE_RE.sub(replace_source, text)
     return text, source_mapping
 
 
-def call_llm(system_prompt, user_prompt, model=None):
-    """Wrapper pour appeler le LLM avec system et user prompts."""
+@functools.cache
+def _cloud_model(model):
+    """Nom du modèle sur Ollama cloud, calculé une seule fois par modèle."""
+    return model + "-cloud"
+
+
+def _call(model, system_prompt, user_prompt, *, format=None):
+    """Appel LLM commun : chat() en cloud, generate() en local."""
     if model is None:
         model = settings.RAG_MODEL
     
     if USE_CLOUD:
         # Cloud: use chat() API
-        messages = [
-            {"role": "system", "content": system_prompt},
-            {"role": "user", "content": user_prompt},
-        ]
         cloud_response = ollama_client.chat(
-            model=model + "-cloud",
-            messages=messages
+            model=_cloud_model(model),
+            messages=[
+                {"role": "system", "content": system_prompt},
+                {"role": "user", "content": user_prompt},
+            ],
+            format=format
         )
         return cloud_response['message']['content']
     else:
@@ -91,36 +139,159 @@ def call_llm(system_prompt, user_prompt, model=None):
         local_response = ollama_client.generate(
             model=model,
             prompt=user_prompt,
-            system=system_prompt
+            system=system_prompt,
+            format=format,
+            keep_alive=settings.RAG_KEEP_ALIVE  # model (and its prompt prefix cache) stays loaded between agent calls
         )
         return local_response['response']
 
 
-def call_llm_structured_output(system_prompt, user_prompt,schema, model=None):
+def call_llm(system_prompt, user_prompt, model=None):
     """Wrapper pour appeler le LLM avec system et user prompts."""
+    return _call(model, system_prompt, user_prompt)
+
+
+def call_llm_cached(system_prompt, user_prompt, model=None):
+    """Comme call_llm, mais réutilise la réponse si les mêmes prompts ont déjà été envoyés."""
     if model is None:
         model = settings.RAG_MODEL
-    
-    if USE_CLOUD:
-        # Cloud: use chat() API
-        messages = [
-            {"role": "system", "content": system_prompt},
-            {"role": "user", "content": user_prompt},
-        ]
-        cloud_response = ollama_client.chat(
-            model=model + "-cloud",
-            messages=messages,
-            format=schema
-        )
-        return cloud_response['message']['content']
-    else:
-        # Local: use generate() API
-        local_response = ollama_client.generate(
-            model=model,
-            prompt=user_prompt,
-            system=system_prompt
-        )
-        return local_response['response']
+
+    digest = hashlib.blake2b(digest_size=16)
+    for part in (model, system_prompt, user_prompt):
+        digest.update(part.encode('utf-8'))
+        digest.update(b'\0')
+    key = digest.digest()
+
+    with _llm_cache_lock:
+        if key in _llm_cache:
+            _llm_cache.move_to_end(key)
+            return _llm_cache[key]
+
+    response = call_llm(system_prompt, user_prompt, model=model)
+
+    with _llm_cache_lock:
+        _llm_cache[key] = response
+        if len(_llm_cache) > LLM_CACHE_SIZE:
+            _llm_cache.popitem(last=False)
+
+    return response
+
+
+def call_llm_structured_output(system_prompt, user_prompt,schema, model=None):
+    """Wrapper pour appeler le LLM avec system et user prompts."""
+    return _call(model, system_prompt, user_prompt, format=schema)
+
+# JSON repairs may be requested by several agent threads at once: cap them, retry transient failures
+JSON_REPAIR_CONCURRENCY = 2
+JSON_REPAIR_ATTEMPTS = 3
+_json_repair_semaphore = threading.BoundedSemaphore(JSON_REPAIR_CONCURRENCY)
+
+
+def _call_llm_for_repair(system_prompt, user_prompt):
+    """call_llm_cached limité à JSON_REPAIR_CONCURRENCY appels simultanés, avec backoff exponentiel."""
+    for attempt in range(JSON_REPAIR_ATTEMPTS):
+        try:
+            with _json_repair_semaphore:
+                return call_llm_cached(system_prompt, user_prompt)
+        except (httpx.TransportError, ResponseError):
+            if attempt == JSON_REPAIR_ATTEMPTS - 1:
+                raise
+        time.sleep(min(0.5 * 2 ** attempt, 4))
+
+
+def _remove_trailing_commas(text):
+    """Retire les virgules placées juste avant } ou ] (hors chaînes de caractères)."""
+    chars = []
+    in_string = False
+    escaped = False
+    comma = -1
+    for ch in text:
+        if in_string:
+            if escaped:
+                escaped = False
+            elif ch == '\\':
+                escaped = True
+            elif ch == '"':
+                in_string = False
+        elif ch == '"':
+            in_string = True
+            comma = -1
+        elif ch == ',':
+            comma = len(chars)
+        elif ch in '}]':
+            if comma >= 0:
+                chars[comma] = ''
+            comma = -1
+        elif not ch.isspace():
+            comma = -1
+        chars.append(ch)
+    return ''.join(chars)
+
+
+def _extract_json_object(text, brackets='{}'):
+    """
+    Isole le premier objet {...} (ou tableau [...] avec brackets='[]')
+    équilibré du texte, en une seule passe.
+
+    Les accolades à l'intérieur des chaînes sont ignorées. Si l'objet n'est
+    jamais refermé (réponse tronquée), on retombe sur la dernière accolade fermante.
+    """
+    opening, closing = brackets
+    start = text.find(opening)
+    if start == -1:
+        return None
+    depth = 0
+    in_string = False
+    escaped = False
+    for i in range(start, len(text)):
+        ch = text[i]
+        if in_string:
+            if escaped:
+                escaped = False
+            elif ch == '\\':
+                escaped = True
+            elif ch == '"':
+                in_string = False
+        elif ch == '"':
+            in_string = True
+        elif ch == opening:
+            depth += 1
+        elif ch == closing:
+            depth -= 1
+            if depth == 0:
+                return text[start:i + 1]
+    end = text.rfind(closing) + 1
+    return text[start:end] if end > start else None
+
+
+def parse_json_response(response, brackets='{}'):
+    """
+    Parse l'objet JSON contenu dans une réponse du LLM, sans appel supplémentaire.
+    brackets='[]' parse un tableau au lieu d'un objet.
+
+    Le texte autour de l'objet (explications, blocs markdown) est ignoré, et les
+    virgules finales ainsi que les clés entre apostrophes sont corrigées
+    localement : fix_malformed_json (un appel LLM) n'est plus nécessaire pour
+    ces cas triviaux.
+
+    Raises:
+        ValueError: si aucun objet JSON valide n'a pu être extrait
+    """
+    candidate = _extract_json_object(response, brackets)
+    if candidate is None:
+        raise ValueError("No JSON value found in response")
+
+    try:
+        return orjson.loads(candidate)
+    except orjson.JSONDecodeError as e:
+        repaired = _SINGLE_QUOTED_KEY_RE.sub(r'"\1":', _remove_trailing_commas(candidate))
+        if repaired == candidate:
+            raise
+        try:
+            return orjson.loads(repaired)
+        except orjson.JSONDecodeError:
+            raise e
+
 
 def fix_malformed_json(broken_json, expected_structure_description, error_message):
         """
@@ -167,27 +338,24 @@ EXPECTED STRUCTURE:
 Fix this JSON and return ONLY the corrected, valid JSON. No explanations, no markdown, just valid JSON."""
 
         try:
-            corrected = call_llm(system_prompt, user_prompt)
+            corrected = _call_llm_for_repair(system_prompt, user_prompt)
             
             # Try to extract JSON if LLM wrapped it in markdown or text
             corrected = corrected.strip()
             
             # Remove markdown code blocks if present
             if corrected.startswith('```'):
-                corrected = re.sub(r'^```(?:json)?\s*\n?', '', corrected)
-                corrected = re.sub(r'\n?```\s*$', '', corrected)
+                corrected = _FENCE_OPEN_RE.sub('', corrected)
+                corrected = _FENCE_CLOSE_RE.sub('', corrected)
             
             # Try to find JSON object
-            start = corrected.find('{')
-            end = corrected.rfind('}') + 1
-            if start != -1 and end > start:
-                corrected = corrected[start:end]
+            corrected = _extract_json_object(corrected) or corrected
             
-            # Validate it parses
-            json.loads(corrected)
-            print(f"   ✓ JSON successfully repaired by LLM")
+            # Validate it parses (orjson + the same local repairs callers apply)
+            parse_json_response(corrected)
+            report(f"   ✓ JSON successfully repaired by LLM")
             return corrected
             
         except Exception as repair_error:
-            print(f"   ✗ Failed to repair JSON: {repair_error}")
+            report(f"   ✗ Failed to repair JSON: {repair_error}")
             return None
\ No newline at end of file
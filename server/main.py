@@ -22,5 +22,9 @@ if __name__ == "__main__":
         host=settings.SERVER_HOST,
         port=settings.SERVER_PORT,
         log_level=settings.LOG_LEVEL,
-        reload=True  # Enable auto-reload for development
+        reload=settings.DEV_MODE,
+        workers=1 if settings.DEV_MODE else settings.WORKERS,
+        loop="auto",  # uvloop when installed (uvicorn[standard], non-Windows)
+        http="auto",  # httptools when installed
+        access_log=False
     )
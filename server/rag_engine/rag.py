@@ -1,26 +1,47 @@
-from retrivers.hybrid_retriever import retrieve
+from retrivers.hybrid_retriever import retrieve, _embed
+import asyncio
 import os
+import httpx
 import ollama
-from ollama import Client
+from ollama import AsyncClient, Client
 import sys
 from pathlib import Path
-import json
+import orjson
+import logging
+import pickle
+import re
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+import numpy as np
 
 # open global_hashes.json
-with open(Path(__file__).parent / "global_hashes.json", "r") as f:
-    global_hashes = json.load(f)
+# Keys are interned so lookups on the per-chunk source URLs hash-compare cheaply
+with open(Path(__file__).parent / "global_hashes.json", "rb") as f:
+    global_hashes = {sys.intern(url): code for url, code in orjson.loads(f.read()).items()}
     
 
-# Create Ollama client: cloud if key exists, local otherwise
+logger = logging.getLogger(__name__)
+
+# One keep-alive pool shared by all concurrent RAG requests (extra kwargs of
+# ollama.Client go to its underlying httpx.Client)
+OLLAMA_POOL_LIMITS = httpx.Limits(max_connections=100, max_keepalive_connections=100)
+
+# Create Ollama clients (sync + async, same settings): cloud if key exists, local otherwise
 if os.environ.get("OLLAMA_API_KEY"):
-    ollama_client = Client(
-        host="https://ollama.com",
-        headers={"Authorization": f"Bearer {os.environ.get('OLLAMA_API_KEY')}"}
-    )
+    _client_kwargs = {
+        "host": "https://ollama.com",
+        "headers": {"Authorization": f"Bearer {os.environ.get('OLLAMA_API_KEY')}"},
+        "limits": OLLAMA_POOL_LIMITS,
+        "http2": True  # multiplex concurrent generations over one TLS connection
+    }
     USE_CLOUD = True
 else:
-    ollama_client = Client(host=os.environ.get("OLLAMA_BASE_URL"))
+    _client_kwargs = {"host": os.environ.get("OLLAMA_BASE_URL"), "limits": OLLAMA_POOL_LIMITS}
     USE_CLOUD = False
+ollama_client = Client(**_client_kwargs)
+async_ollama_client = AsyncClient(**_client_kwargs)
 
 # Add parent directory to path to import config
 sys.path.insert(0, str(Path(__file__).parent.parent))
@@ -29,30 +50,196 @@ from config_loader import settings
 # Load fileserver base URL from environment
 FILESERVER_BASE = os.environ.get("FILESERVER_BASE", "http://localhost:7700")
 
+# Citations émises par le LLM : [SOURCE X]
+_SOURCE_RE = re.compile(r'\[\s*SOURCE\s+(\d+)\s*\]', re.IGNORECASE)
+# Au-delà de cette longueur, un '[' non fermé ne peut plus être un [SOURCE X]
+_MAX_CITATION_LEN = 32
+
+
+class SemanticCache:
+    """
+    Cache de réponses RAG indexé par l'embedding de la question.
+
+    Une question dont l'embedding a une similarité cosinus >= threshold avec
+    une question déjà traitée réutilise la réponse stockée, sans retrieval ni
+    appel LLM. Les embeddings normalisés sont rangés dans une matrice
+    préallouée (un slot par entrée) et l'éviction est LRU.
+
+    Les entrées expirent après ttl secondes (0 : jamais) et le cache sauvegardé
+    n'est rechargé que s'il a été produit par le même modèle.
+    """
+
+    def __init__(self, threshold, max_entries, ttl=0, model=None):
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.model = model
+        self._vectors = None  # alloué au premier store, quand la dimension est connue
+        self._entries = OrderedDict()  # slot -> (top_k, answer, sources, stored_at)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _normalize(embedding):
+        vec = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vec)
+        return vec / norm if norm else vec
+
+    def lookup(self, embedding, top_k):
+        """Retourne (answer, sources) si une question proche est en cache."""
+        vec = self._normalize(embedding)
+        with self._lock:
+            found = self._find(vec, top_k)
+            if found is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            return found
+
+    def _find(self, vec, top_k):
+        if not self._entries or self._vectors.shape[1] != vec.shape[0]:
+            return None
+        # Les slots occupés sont toujours 0..len-1 (réutilisés à l'éviction)
+        scores = self._vectors[:len(self._entries)] @ vec
+        # Candidats au-dessus du seuil, du plus proche au moins proche : le
+        # meilleur peut avoir un autre top_k ou être périmé sans qu'un suivant le soit
+        candidates = np.flatnonzero(scores >= self.threshold)
+        if not len(candidates):
+            return None
+        now = time.time()
+        expired = []
+        found = None
+        for slot in candidates[np.argsort(-scores[candidates])].tolist():
+            cached_top_k, answer, sources, stored_at = self._entries[slot]
+            if self.ttl and now - stored_at > self.ttl:
+                expired.append(slot)
+                continue
+            if cached_top_k == top_k:
+                self._entries.move_to_end(slot)
+                found = answer, sources
+                break
+        # Libérer les slots périmés (du plus haut au plus bas, _drop déplace le dernier)
+        for slot in sorted(expired, reverse=True):
+            self._drop(slot)
+        return found
+
+    def _drop(self, slot):
+        # Le dernier slot occupé prend la place libérée (slots 0..len-1 contigus)
+        last = len(self._entries) - 1
+        if slot != last:
+            self._vectors[slot] = self._vectors[last]
+        self._entries = OrderedDict(
+            (slot if key == last else key, entry)
+            for key, entry in self._entries.items() if key != slot
+        )
 
-def context_from_query(query, top_k=5):
+    def stats(self):
+        """Compteurs de hits/misses depuis le démarrage."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0
+            }
+
+    def store(self, embedding, top_k, answer, sources, stored_at=None):
+        if self.max_entries <= 0:
+            return
+        vec = self._normalize(embedding)
+        with self._lock:
+            if self._vectors is None or self._vectors.shape[1] != vec.shape[0]:
+                self._vectors = np.zeros((self.max_entries, vec.shape[0]), dtype=np.float32)
+                self._entries.clear()
+            if len(self._entries) < self.max_entries:
+                slot = len(self._entries)
+            else:
+                slot, _ = self._entries.popitem(last=False)
+            self._vectors[slot] = vec
+            self._entries[slot] = (top_k, answer, sources, stored_at or time.time())
+
+    def save(self, path):
+        """Sauvegarde le cache sur disque (ordre LRU conservé)."""
+        with self._lock:
+            if not self._entries:
+                return
+            slots = list(self._entries)
+            state = {
+                "model": self.model,
+                "vectors": self._vectors[slots],
+                "entries": [self._entries[slot] for slot in slots]
+            }
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # Fichier temporaire du même dossier puis os.replace : un lecteur ne
+        # voit jamais un pickle à moitié écrit
+        fd, tmp_path = tempfile.mkstemp(dir=path.parent, prefix=path.name + ".", suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                pickle.dump(state, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+
+    def load(self, path):
+        """Recharge un cache sauvegardé par save(), s'il existe."""
+        path = Path(path)
+        if not path.exists():
+            return
+        try:
+            with open(path, "rb") as f:
+                state = pickle.load(f)
+            # Réponses d'un autre modèle (ou ancien format) : on repart à vide
+            if not isinstance(state, dict) or state.get("model") != self.model:
+                return
+            items = list(zip(state["vectors"], state["entries"]))[-self.max_entries:]
+            for vec, entry in items:
+                self.store(vec, *entry)
+        except (EOFError, pickle.UnpicklingError, OSError, KeyError, ValueError, TypeError) as e:
+            # Fichier tronqué ou corrompu : le serveur doit démarrer quand même
+            logger.warning("Semantic cache %s unreadable (%s), starting empty", path, e)
+            with self._lock:
+                self._entries.clear()
+                self._vectors = None
+
+
+semantic_cache = SemanticCache(
+    threshold=settings.RAG_SEMANTIC_CACHE_THRESHOLD,
+    max_entries=settings.RAG_SEMANTIC_CACHE_SIZE,
+    ttl=settings.RAG_SEMANTIC_CACHE_TTL,
+    model=settings.RAG_MODEL
+)
+semantic_cache.load(settings.RAG_SEMANTIC_CACHE_PATH)
+
+
+def context_from_query(query, top_k=5, query_vector=None):
     """Récupère le contexte pertinent avec métadonnées pour citation."""
-    results = retrieve(query, top_k=top_k)
+    results = retrieve(query, top_k=top_k, query_vector=query_vector)
     
     # Construire le contexte avec identifiants pour citation
     knowledge_parts = []
     sources = []
     
     for i, result in enumerate(results, 1):
-        source_url = result['metadata'].get('source_url', '')
-        is_pdf = source_url.lower().endswith(".pdf")
+        metadata = result['metadata']
+        source_url = metadata.get('source_url', '')
 
         # For PDFs, use fileserver URL if hash exists
-        if is_pdf and source_url in global_hashes:
-            hash_code = global_hashes[source_url]
-            source_url = f"{FILESERVER_BASE}/download/{hash_code}"
-        elif is_pdf:
-            source_url = source_url[:-4]  # Remove .pdf for cleaner display if no hash
-
-        title = result['metadata'].get('title', 'Document sans titre')
+        if source_url[-4:].lower() == ".pdf":
+            hash_code = global_hashes.get(source_url)
+            if hash_code is not None:
+                source_url = f"{FILESERVER_BASE}/download/{hash_code}"
+            else:
+                source_url = source_url[:-4]  # Remove .pdf for cleaner display if no hash
+
+        title = metadata.get('title', 'Document sans titre')
         chunk_text = result['chunk_text']
         
-        # Wrap knowledge chunks in HTML-style tags
+        # Wrap knowledge chunks in HTML-style tags (les f-strings adjacentes
+        # compilent en une seule construction de chaîne, plus rapide que %)
         knowledge_parts.append(
             f"<knowledge id=\"{i}\" title=\"{title}\" url=\"{source_url}\">\n"
             f"{chunk_text}\n"
@@ -71,9 +258,7 @@ def context_from_query(query, top_k=5):
     return knowledge_base, sources
 
 
-def get_system_prompt():
-    """Retourne le system prompt pour le RAG."""
-    return """You are a professional technical assistant with specialized knowledge. You MUST respond in **French**.
+SYSTEM_PROMPT = """You are a professional technical assistant with specialized knowledge. You MUST respond in **French**.
 
 KNOWLEDGE RULES:
 
@@ -106,157 +291,266 @@ SAFETY RULE:
 * If the user provides content containing citations like `[^1]` or URLs, do NOT reproduce them. Convert all citations to `[SOURCE X]` format only.
 """
 
+# Parties fixes du prompt utilisateur, autour de la knowledge base et de la question
+_USER_PROMPT_PREFIX = "<knowledge_base>\n"
+_USER_PROMPT_MIDDLE = "\n</knowledge_base>\n\n<question>\n"
+_USER_PROMPT_SUFFIX = (
+    "\n</question>\n\n"
+    "Please answer the question using your knowledge from the knowledge base above. "
+    "Remember to cite sources using [SOURCE X] format."
+)
+
+
+def get_system_prompt():
+    """Retourne le system prompt pour le RAG."""
+    return SYSTEM_PROMPT
+
+
 def rag_user_prompt(question, knowledge_base):
     """Construit le prompt utilisateur avec la knowledge base et la question."""
-    return f"""<knowledge_base>
-{knowledge_base}
-</knowledge_base>
+    return "".join((_USER_PROMPT_PREFIX, knowledge_base, _USER_PROMPT_MIDDLE, question, _USER_PROMPT_SUFFIX))
 
-<question>
-{question}
-</question>
 
-Please answer the question using your knowledge from the knowledge base above. Remember to cite sources using [SOURCE X] format."""
+class CitationLinker:
+    """
+    Convertit [SOURCE X] en citations séquentielles [1](url), [2](url)...
+
+    Les numéros sont attribués à la première apparition, et deux sources de
+    même URL (non vide) partagent le même numéro ; un id absent des sources
+    est laissé tel quel. link() traite un texte complet ; feed()
+    et flush() traitent un flux de deltas en retenant le dernier '[' non
+    fermé, pour qu'aucun [SOURCE X] ne soit coupé entre deux morceaux.
+    """
+
+    def __init__(self, sources):
+        self.url_by_id = {s['id']: s['url'] for s in sources}
+        self.source_mapping = {}
+        self._url_to_order = {}
+        self._tail = ""
+
+    def _replace(self, match):
+        source_num = int(match.group(1))
+        if source_num not in self.url_by_id:
+            # Id inventé par le modèle : pas de numéro, sinon toute la liste se décale
+            return match.group(0)
+        source_url = self.url_by_id[source_num]
+        if source_num not in self.source_mapping:
+            # Seule une URL non vide partage un numéro ; sans URL, chaque source garde le sien
+            key = source_url or ('id', source_num)
+            self.source_mapping[source_num] = self._url_to_order.setdefault(key, len(self._url_to_order) + 1)
+        return f'[{self.source_mapping[source_num]}]({source_url})'
+
+    def link(self, text):
+        return _SOURCE_RE.sub(self._replace, text)
+
+    def feed(self, delta):
+        """Retourne la partie du flux prête à être envoyée, citations réécrites."""
+        text = self._tail + delta
+        # Une citation ne peut se compléter qu'avec un ']' : sinon pas de regex
+        if ']' in text:
+            text = self.link(text)
+        cut = text.rfind('[')
+        if cut != -1 and ']' not in text[cut:] and len(text) - cut <= _MAX_CITATION_LEN:
+            self._tail = text[cut:]
+            return text[:cut]
+        self._tail = ""
+        return text
+
+    def flush(self):
+        """Retourne ce qui reste retenu en fin de flux."""
+        text, self._tail = self._tail, ""
+        return text
+
+
+def cited_sources(sources, mapping):
+    """
+    Sources citées, dans l'ordre de leur numéro [N] (une seule par numéro),
+    pour que la liste « Sources » numérotée corresponde aux citations du texte.
+    """
+    by_id = {s['id']: s for s in sources}
+    used_sources = []
+    seen_numbers = set()
+    for source_id, number in mapping.items():
+        if number not in seen_numbers and source_id in by_id:
+            seen_numbers.add(number)
+            used_sources.append(by_id[source_id])
+    return used_sources
 
 
 def add_citation_links(text, sources):
     """Convertit [SOURCE X] en citations séquentielles [1](url), [2](url)..."""
-    import re
-    
-    # Trouver tous les numéros SOURCE utilisés
-    used_sources = re.findall(r'\[\s*source\s+(\d+)\s*\]', text, flags=re.IGNORECASE)
-    
-    # Créer mapping SOURCE X -> numéro séquentiel
-    used_sources = map(int, used_sources)
-    source_mapping = {}
-    order = 1
-    url_to_order = {}
-    for src in used_sources:
-        if src not in source_mapping:
-            source_url = next((s['url'] for s in sources if s['id'] == src), '#')
-            if source_url not in url_to_order :
-                url_to_order[source_url] = order
-                source_mapping[src] = order  # Placeholder
-                order += 1
-            else :
-                source_mapping[src] = url_to_order[source_url]
-    
-    # Remplacer [SOURCE X] par [N](url) séquentiel
-    def replace_source(match):
-        source_num = int(match.group(1))
-        if source_num in source_mapping:
-            sequential_num = source_mapping[source_num]
-            # Trouver l'URL correspondante
-            source_url = next((s['url'] for s in sources if s['id'] == source_num), '#')
-            return f'[{sequential_num}]({source_url})'
-        return match.group(0)
-    
-    text = re.sub(r'\[\s*SOURCE\s+(\d+)\s*\]', replace_source, text)
-    
-    return text, source_mapping
+    linker = CitationLinker(sources)
+    return linker.link(text), linker.source_mapping
 
 
-def query_rag(question, top_k=5):
-    """Fonction principale pour interroger le système RAG."""
-    knowledge_base, sources = context_from_query(question, top_k=top_k)
+def _cached_answer(question, top_k):
+    """Embedding de la question et réponse en cache sémantique (ou None)."""
+    question_embedding = _embed(question)
+    return question_embedding, semantic_cache.lookup(question_embedding, top_k)
+
+
+def _replay_cached(cached):
+    """Rejoue une réponse en cache par morceaux pour garder l'UX de streaming."""
+    answer_with_links, used_sources = cached
+    chunk_size = settings.RAG_CHUNK_SIZE
+    for i in range(0, len(answer_with_links), chunk_size):
+        yield {'type': 'thinking', 'content': answer_with_links[i:i + chunk_size]}
+    yield {'type': 'final', 'content': answer_with_links, 'sources': used_sources}
+
+
+def _llm_request(question, knowledge_base):
+    """
+    Appel Ollama à effectuer : chat() pour le cloud, generate() en local,
+    avec séparation system/user. Retourne (nom de méthode, kwargs).
+    """
     system_prompt = get_system_prompt()
     user_prompt = rag_user_prompt(question, knowledge_base)
-
-    # Call with proper system/user separation
     if USE_CLOUD:
-    # Cloud: use chat() API
-        messages = [
-            {"role": "system", "content": system_prompt},
-            {"role": "user", "content": user_prompt},
-        ]
-        cloud_response = ollama_client.chat(
-            model=settings.RAG_MODEL + "-cloud",
-            messages=messages
-        )
-        response_text = cloud_response['message']['content']
-
-    else:
-        # Local model
-        local_response = ollama_client.generate(
-            model=settings.RAG_MODEL,
-            prompt=user_prompt,
-            system=system_prompt
-        )
-        response_text = local_response['response']
+        return "chat", {
+            "model": settings.RAG_MODEL + "-cloud",
+            "messages": [
+                {"role": "system", "content": system_prompt},
+                {"role": "user", "content": user_prompt},
+            ]
+        }
+    return "generate", {
+        "model": settings.RAG_MODEL,
+        "prompt": user_prompt,
+        "system": system_prompt,
+        # Modèle gardé chargé entre les requêtes : le préfixe commun (system
+        # prompt constant, placé avant la knowledge base) reste réutilisable
+        "keep_alive": settings.RAG_KEEP_ALIVE
+    }
+
+
+def _response_text(chunk):
+    """Texte d'une réponse (ou d'un morceau de flux) chat() ou generate()."""
+    if USE_CLOUD:
+        return chunk.get('message', {}).get('content', '')
+    return chunk.get('response', '')
+
+
+def _finish(question_embedding, top_k, answer_with_links, sources, mapping):
+    """Sources citées + mise en cache de la réponse."""
+    # Sources utilisées, dans l'ordre des citations
+    used_sources = cited_sources(sources, mapping)
+    semantic_cache.store(question_embedding, top_k, answer_with_links, used_sources)
+    return answer_with_links, used_sources
+
+
+def query_rag(question, top_k=5):
+    """Fonction principale pour interroger le système RAG."""
+    question_embedding, cached = _cached_answer(question, top_k)
+    if cached:
+        return cached
 
+    # Embedding déjà calculé pour le cache sémantique : pas de second appel
+    knowledge_base, sources = context_from_query(question, top_k=top_k, query_vector=question_embedding)
+    method, request = _llm_request(question, knowledge_base)
+    response_text = _response_text(getattr(ollama_client, method)(**request))
 
     answer_with_links, mapping = add_citation_links(response_text, sources)
+    return _finish(question_embedding, top_k, answer_with_links, sources, mapping)
 
-    # Filtrer sources utilisées
-    used_ids = []
-    used_sources = []
-    for s in sources :
-        if s['id'] in mapping.keys() and s['id'] not in used_ids :
-            used_sources.append(s) 
-            used_ids.append(s['id'])
 
+async def aquery_rag(question, top_k=5):
+    """
+    Version asynchrone de query_rag : seuls l'embedding et le retrieval passent
+    par un thread, la génération est attendue sur la boucle d'événements.
+    """
+    question_embedding, cached = await asyncio.to_thread(_cached_answer, question, top_k)
+    if cached:
+        return cached
 
-    return answer_with_links, used_sources
+    knowledge_base, sources = await asyncio.to_thread(
+        context_from_query, question, top_k=top_k, query_vector=question_embedding
+    )
+    method, request = _llm_request(question, knowledge_base)
+    response_text = _response_text(await getattr(async_ollama_client, method)(**request))
+
+    answer_with_links, mapping = add_citation_links(response_text, sources)
+    return _finish(question_embedding, top_k, answer_with_links, sources, mapping)
 
 
 def stream_rag_with_thinking(question, top_k=5):
     """
     Stream RAG response from Ollama in real-time as thinking.
-    Yields chunks as they arrive, then final corrected response.
+    Yields chunks as they arrive, with [SOURCE X] already rewritten to
+    [N](url), then the final response.
 
     Yields:
         dict: {'type': 'thinking'|'final', 'content': str, 'sources': list}
     """
-    # Get context and sources
-    knowledge_base, sources = context_from_query(question, top_k=top_k)
-    system_prompt = get_system_prompt()
-    user_prompt = rag_user_prompt(question, knowledge_base)
+    question_embedding, cached = _cached_answer(question, top_k)
+    if cached:
+        yield from _replay_cached(cached)
+        return
 
-    # Stream from Ollama
-    response_text = ""
+    # Get context and sources
+    # Embedding déjà calculé pour le cache sémantique : pas de second appel
+    knowledge_base, sources = context_from_query(question, top_k=top_k, query_vector=question_embedding)
+    method, request = _llm_request(question, knowledge_base)
+
+    # Stream from Ollama, rewriting citations as they arrive
+    linker = CitationLinker(sources)
+    linked_parts = []
+
+    for chunk in getattr(ollama_client, method)(**request, stream=True):
+        delta = _response_text(chunk)
+        linked = linker.feed(delta) if delta else ""
+        if linked:
+            linked_parts.append(linked)
+            # Yield as thinking
+            yield {'type': 'thinking', 'content': linked}
+
+    rest = linker.flush()
+    if rest:
+        linked_parts.append(rest)
+        yield {'type': 'thinking', 'content': rest}
+
+    answer_with_links, used_sources = _finish(
+        question_embedding, top_k, "".join(linked_parts), sources, linker.source_mapping
+    )
 
-    if USE_CLOUD:
-        # Cloud: use chat() API with streaming
-        messages = [
-            {"role": "system", "content": system_prompt},
-            {"role": "user", "content": user_prompt},
-        ]
-        stream = ollama_client.chat(
-            model=settings.RAG_MODEL + "-cloud",
-            messages=messages,
-            stream=True
-        )
+    # Yield final corrected response
+    yield {'type': 'final', 'content': answer_with_links, 'sources': used_sources}
 
-        for chunk in stream:
-            delta = chunk.get('message', {}).get('content', '')
-            if delta:
-                response_text += delta
-                # Yield as thinking
-                yield {'type': 'thinking', 'content': delta}
-
-    else:
-        # Local model with streaming
-        stream = ollama_client.generate(
-            model=settings.RAG_MODEL,
-            prompt=user_prompt,
-            system=system_prompt,
-            stream=True
-        )
 
-        for chunk in stream:
-            delta = chunk.get('response', '')
-            if delta:
-                response_text += delta
-                # Yield as thinking
-                yield {'type': 'thinking', 'content': delta}
+async def astream_rag_with_thinking(question, top_k=5):
+    """
+    Version asynchrone de stream_rag_with_thinking (mêmes événements).
 
-    # Now fix the sources in the complete response
-    answer_with_links, mapping = add_citation_links(response_text, sources)
+    Le flux Ollama est lu avec le client asynchrone : aucun thread n'est
+    occupé pendant la génération, et si le consommateur s'arrête (client
+    déconnecté) la requête Ollama est abandonnée avec le générateur.
+    """
+    question_embedding, cached = await asyncio.to_thread(_cached_answer, question, top_k)
+    if cached:
+        for update in _replay_cached(cached):
+            yield update
+        return
+
+    knowledge_base, sources = await asyncio.to_thread(
+        context_from_query, question, top_k=top_k, query_vector=question_embedding
+    )
+    method, request = _llm_request(question, knowledge_base)
 
-    # Filter used sources
-    used_sources = [s for s in sources if s['id'] in mapping.keys()]
+    linker = CitationLinker(sources)
+    linked_parts = []
 
-    # Yield final corrected response
-    yield {'type': 'final', 'content': answer_with_links, 'sources': used_sources}
+    async for chunk in await getattr(async_ollama_client, method)(**request, stream=True):
+        delta = _response_text(chunk)
+        linked = linker.feed(delta) if delta else ""
+        if linked:
+            linked_parts.append(linked)
+            yield {'type': 'thinking', 'content': linked}
 
+    rest = linker.flush()
+    if rest:
+        linked_parts.append(rest)
+        yield {'type': 'thinking', 'content': rest}
 
+    answer_with_links, used_sources = _finish(
+        question_embedding, top_k, "".join(linked_parts), sources, linker.source_mapping
+    )
+    yield {'type': 'final', 'content': answer_with_links, 'sources': used_sources}
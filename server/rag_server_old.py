@@ -8,12 +8,13 @@ from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
 from typing import Optional, List
 from datetime import datetime
-import json
+import time
+import orjson
 import asyncio
 import uuid
 import os
 
-from rag_engine.rag import query_rag
+from rag_engine.rag import query_rag, stream_rag_with_thinking
 from course_build_agents.orchestrator_with_logging import MultiAgentOrchestratorWithLogging
 from config_loader import settings
 
@@ -69,58 +70,84 @@ async def get_current_user(authorization: str = Header(None)):
 # RAG STREAMING
 # ==========================================================
 
+def _sse(payload: dict) -> str:
+    """Format one server-sent event (orjson: C encoder, called per token)."""
+    return f"data: {orjson.dumps(payload).decode()}\n\n"
+
+
 async def stream_rag_response(question: str, top_k: int = 5, model: str = "rag-hybrid"):
     try:
-        message_id = f"chatcmpl-{uuid.uuid4().hex[:12]}"
-        created_timestamp = int(datetime.now().timestamp())
-
-        loop = asyncio.get_event_loop()
-        answer_with_links, used_sources = await loop.run_in_executor(
-            None, query_rag, question, top_k
-        )
+        # Fields shared by every chunk of this response
+        chunk_base = {
+            "id": f"chatcmpl-{uuid.uuid4().hex[:12]}",
+            "object": "chat.completion.chunk",
+            "created": int(time.time()),
+            "model": model
+        }
 
-        if used_sources:
-            sources_text = "\n\n**Sources:**\n"
-            for idx, source in enumerate(used_sources, 1):
-                sources_text += f"{idx}. [{source['title']}]({source['url']})\n"
-            answer_with_links += sources_text
-
-        chunk_size = settings.RAG_CHUNK_SIZE
-        for i in range(0, len(answer_with_links), chunk_size):
-            chunk = answer_with_links[i:i+chunk_size]
-            chunk_data = {
-                "id": message_id,
-                "object": "chat.completion.chunk",
-                "created": created_timestamp,
-                "model": model,
+        # Thinking chunks differ only by their text: serialize the envelope once
+        # and JSON-encode just the token per chunk
+        marker = '"reasoning_content":""'
+        envelope = orjson.dumps({
+            **chunk_base,
+            "choices": [{
+                "index": 0,
+                "delta": {"role": "assistant", "reasoning_content": ""},
+                "finish_reason": None
+            }]
+        }).decode()
+        cut = envelope.index(marker) + len(marker) - 2
+        thinking_prefix, thinking_suffix = "data: " + envelope[:cut], envelope[cut + 2:] + "\n\n"
+
+        # Ollama tokens are pushed from a worker thread as they are generated
+        loop = asyncio.get_running_loop()
+        queue = asyncio.Queue()
+
+        def produce():
+            try:
+                for update in stream_rag_with_thinking(question, top_k):
+                    loop.call_soon_threadsafe(queue.put_nowait, update)
+            except Exception as e:
+                loop.call_soon_threadsafe(queue.put_nowait, e)
+            finally:
+                loop.call_soon_threadsafe(queue.put_nowait, None)
+
+        loop.run_in_executor(None, produce)
+
+        while (update := await queue.get()) is not None:
+            if isinstance(update, Exception):
+                raise update
+
+            if update['type'] == 'thinking':
+                # Raw tokens go to the reasoning box while the answer is generated
+                yield thinking_prefix + orjson.dumps(update['content']).decode() + thinking_suffix
+                continue
+
+            # Final answer, citations rewritten, plus the sources list
+            answer_with_links = update['content']
+            used_sources = update['sources']
+            if used_sources:
+                answer_with_links += "\n\n**Sources:**\n" + "".join(
+                    f"{idx}. [{source['title']}]({source['url']})\n"
+                    for idx, source in enumerate(used_sources, 1)
+                )
+
+            yield _sse({
+                **chunk_base,
                 "choices": [{
                     "index": 0,
-                    "delta": {"content": chunk},
-                    "finish_reason": None
+                    "delta": {"content": answer_with_links},
+                    "finish_reason": "stop"
                 }]
-            }
-            yield f"data: {json.dumps(chunk_data)}\n\n"
-            await asyncio.sleep(settings.RAG_CHUNK_DELAY)
+            })
 
-        final_chunk = {
-            "id": message_id,
-            "object": "chat.completion.chunk",
-            "created": created_timestamp,
-            "model": model,
-            "choices": [{
-                "index": 0,
-                "delta": {},
-                "finish_reason": "stop"
-            }]
-        }
-        yield f"data: {json.dumps(final_chunk)}\n\n"
         yield "data: [DONE]\n\n"
 
     except Exception as e:
         error_chunk = {
             "id": f"chatcmpl-{uuid.uuid4().hex[:12]}",
             "object": "chat.completion.chunk",
-            "created": int(datetime.now().timestamp()),
+            "created": int(time.time()),
             "model": model,
             "choices": [{
                 "index": 0,
@@ -128,7 +155,7 @@ async def stream_rag_response(question: str, top_k: int = 5, model: str = "rag-h
                 "finish_reason": "stop"
             }]
         }
-        yield f"data: {json.dumps(error_chunk)}\n\n"
+        yield _sse(error_chunk)
         yield "data: [DONE]\n\n"
 
 # ==========================================================
@@ -142,18 +169,19 @@ async def rag_models(current_user: dict = Depends(get_current_user)):
         "data": [{
             "id": "rag-hybrid",
             "object": "model",
-            "created": int(datetime.now().timestamp()),
+            "created": int(time.time()),
             "owned_by": "custom"
         }]
     }
 
 @app.post("/rag/api/chat/completions")
 async def rag_chat(request: ChatRequest, current_user: dict = Depends(get_current_user)):
-    user_messages = [msg for msg in request.messages if msg.role == "user"]
-    if not user_messages:
+    # Last user message, scanning back from the end of the history
+    last_user = next((msg for msg in reversed(request.messages) if msg.role == "user"), None)
+    if last_user is None:
         raise HTTPException(status_code=400, detail="No user message found")
 
-    question = user_messages[-1].content
+    question = last_user.content
     top_k = request.top_k or settings.RAG_DEFAULT_TOP_K
 
     if request.stream:
@@ -169,15 +197,15 @@ async def rag_chat(request: ChatRequest, current_user: dict = Depends(get_curren
     else:
         answer_with_links, used_sources = query_rag(question, top_k=top_k)
         if used_sources:
-            sources_text = "\n\n**Sources:**\n"
-            for idx, source in enumerate(used_sources, 1):
-                sources_text += f"{idx}. [{source['title']}]({source['url']})\n"
-            answer_with_links += sources_text
+            answer_with_links += "\n\n**Sources:**\n" + "".join(
+                f"{idx}. [{source['title']}]({source['url']})\n"
+                for idx, source in enumerate(used_sources, 1)
+            )
 
         return {
             "id": f"chatcmpl-{uuid.uuid4().hex[:12]}",
             "object": "chat.completion",
-            "created": int(datetime.now().timestamp()),
+            "created": int(time.time()),
             "model": request.model,
             "choices": [{
                 "index": 0,
@@ -202,7 +230,7 @@ async def course_models(current_user: dict = Depends(get_current_user)):
         "data": [{
             "id": "course-generator",
             "object": "model",
-            "created": int(datetime.now().timestamp()),
+            "created": int(time.time()),
             "owned_by": "custom"
         }]
     }
@@ -210,16 +238,17 @@ async def course_models(current_user: dict = Depends(get_current_user)):
 
 @app.post("/course/api/chat/completions")
 async def course_chat(request: ChatRequest, current_user: dict = Depends(get_current_user)):
-    user_messages = [msg for msg in request.messages if msg.role == "user"]
-    if not user_messages:
+    # Last user message, scanning back from the end of the history
+    last_user = next((msg for msg in reversed(request.messages) if msg.role == "user"), None)
+    if last_user is None:
         raise HTTPException(status_code=400, detail="Aucun message utilisateur trouvé")
 
-    subject = user_messages[-1].content.strip()
+    subject = last_user.content.strip()
     if not subject:
         return {
             "id": f"chatcmpl-{uuid.uuid4().hex[:12]}",
             "object": "chat.completion",
-            "created": int(datetime.now().timestamp()),
+            "created": int(time.time()),
             "model": request.model,
             "choices": [{
                 "index": 0,
@@ -231,7 +260,7 @@ async def course_chat(request: ChatRequest, current_user: dict = Depends(get_cur
     # ---- STREAMING WITH HEARTBEATS ----
     async def heartbeat_stream():
         message_id = f"chatcmpl-{uuid.uuid4().hex[:12]}"
-        created_timestamp = int(datetime.now().timestamp())
+        created_timestamp = int(time.time())
 
         # Prepare orchestrator & paths
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
@@ -247,24 +276,28 @@ async def course_chat(request: ChatRequest, current_user: dict = Depends(get_cur
 
         orchestrator = MultiAgentOrchestratorWithLogging(config)
 
-        loop = asyncio.get_event_loop()
+        loop = asyncio.get_running_loop()
         task = loop.run_in_executor(None, orchestrator.run, subject)
 
-        # HEARTBEAT LOOP (configurable interval)
-        while not task.done():
-            heartbeat = {
-                "id": message_id,
-                "object": "chat.completion.chunk",
-                "created": created_timestamp,
-                "model": request.model,
-                "choices": [{
-                    "index": 0,
-                    "delta": {},        # empty delta = no display for user
-                    "finish_reason": None
-                }]
-            }
-            yield f"data: {json.dumps(heartbeat)}\n\n"
-            await asyncio.sleep(settings.COURSE_HEARTBEAT_INTERVAL)
+        # The heartbeat never changes: serialize it once
+        heartbeat = _sse({
+            "id": message_id,
+            "object": "chat.completion.chunk",
+            "created": created_timestamp,
+            "model": request.model,
+            "choices": [{
+                "index": 0,
+                "delta": {},        # empty delta = no display for user
+                "finish_reason": None
+            }]
+        })
+
+        # HEARTBEAT LOOP: wake on completion or after the interval, whichever comes first
+        while True:
+            yield heartbeat
+            done, _ = await asyncio.wait({task}, timeout=settings.COURSE_HEARTBEAT_INTERVAL)
+            if done:
+                break
 
         # ---- FINAL RESULT ----
         results = await task
@@ -292,7 +325,7 @@ async def course_chat(request: ChatRequest, current_user: dict = Depends(get_cur
             }]
         }
 
-        yield f"data: {json.dumps(final_payload)}\n\n"
+        yield _sse(final_payload)
         yield "data: [DONE]\n\n"
 
     return StreamingResponse(
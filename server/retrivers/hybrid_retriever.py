@@ -1,9 +1,12 @@
 import re
+import functools
 import spacy
 from elasticsearch import Elasticsearch
 from qdrant_client import QdrantClient
 from qdrant_client.models import PointStruct
 import requests
+from requests.adapters import HTTPAdapter
+from concurrent.futures import ThreadPoolExecutor
 from typing import List, Dict
 import sys
 from pathlib import Path
@@ -20,14 +23,23 @@ from config_loader import settings
 es = Elasticsearch(settings.ELASTICSEARCH_URL)
 
 # --- Qdrant ---
-qdrant = QdrantClient(url=settings.QDRANT_URL)
+# gRPC (protobuf, HTTP/2 multiplexing) for query_points/retrieve; REST stays on QDRANT_URL
+qdrant = QdrantClient(url=settings.QDRANT_URL, grpc_port=settings.QDRANT_GRPC_PORT, prefer_grpc=True)
 
 # --- Embeddings (Ollama) ---
+# Pooled keep-alive connections: retrieve() is called from many threads at once
 session = requests.Session()
+session.mount("http://", HTTPAdapter(pool_connections=16, pool_maxsize=32))
+session.mount("https://", HTTPAdapter(pool_connections=16, pool_maxsize=32))
+
+# BM25 runs here while the calling thread does the vector search
+_search_pool = ThreadPoolExecutor(max_workers=8, thread_name_prefix="bm25")
 
 # --- Lemmatizer (French) ---
+# Only lemmas are used: the parser, NER and sentence splitter are never loaded.
+# morphologizer + attribute_ruler stay, the rule-based lemmatizer needs their POS.
 print("Loading spaCy French model...")
-_nlp = spacy.load(settings.SPACY_MODEL)
+_nlp = spacy.load(settings.SPACY_MODEL, exclude=["parser", "ner", "senter"])
 
 # Hybrid weights
 BM25_WEIGHT = settings.BM25_WEIGHT
@@ -41,24 +53,36 @@ FINAL_K = settings.RETRIEVER_FINAL_K
 # NORMALIZATION + LEMMATIZATION
 # ==========================================================
 
+# Markdown cleanup passes, compiled once at import
+_MARKDOWN_CLEANUP = (
+    (re.compile(r"```[\s\S]*?```"), " "),
+    (re.compile(r"!\[[^\]]*\]\([^)]+\)"), " "),
+    (re.compile(r"\[([^\]]+)\]\([^)]+\)"), r"\1"),
+    (re.compile(r"#+\s*"), " "),
+    (re.compile(r"`([^`]*)`"), r"\1"),
+    (re.compile(r"[*_]{1,3}"), " "),
+    (re.compile(r"^\s*[-*+]\s*", re.MULTILINE), " "),
+    (re.compile(r"^\s*>\s*", re.MULTILINE), " "),
+    # tables, rules, brackets and HTML tags all become a space: one pass
+    (re.compile(r"\|.*\||<[^>]+>|[-*_]{3,}|[{}\[\]]"), " "),
+)
+_WHITESPACE = re.compile(r"\s+")
+
+# Anything one of the cleanup passes could match; short text without it is plain
+_MARKDOWN_HINT = re.compile(r"[`#|<>\[\]{}*_]|^\s*[-+]|---", re.MULTILINE)
+_PLAIN_TEXT_MAX_LEN = 256
+
+
+@functools.lru_cache(maxsize=4096)
 def normalize_and_lemmatize(text: str) -> str:
     """Clean markdown + lowercase + French lemmatization."""
-    # --- Remove markdown blocks ---
-    text = re.sub(r"```[\s\S]*?```", " ", text)
-    text = re.sub(r"!\[[^\]]*\]\([^)]+\)", " ", text)
-    text = re.sub(r"\[([^\]]+)\]\([^)]+\)", r"\1", text)
-    text = re.sub(r"#+\s*", " ", text)
-    text = re.sub(r"`([^`]*)`", r"\1", text)
-    text = re.sub(r"[*_]{1,3}", " ", text)
-    text = re.sub(r"^\s*[-*+]\s*", " ", text, flags=re.MULTILINE)
-    text = re.sub(r"^\s*>\s*", " ", text, flags=re.MULTILINE)
-    text = re.sub(r"\|.*\|", " ", text)
-    text = re.sub(r"[-*_]{3,}", " ", text)
-    text = re.sub(r"[{}\[\]]", " ", text)
-    text = re.sub(r"<[^>]+>", " ", text)
+    # --- Remove markdown blocks (user questions are usually plain text) ---
+    if len(text) >= _PLAIN_TEXT_MAX_LEN or _MARKDOWN_HINT.search(text):
+        for pattern, repl in _MARKDOWN_CLEANUP:
+            text = pattern.sub(repl, text)
 
     # Normalize whitespace
-    text = re.sub(r"\s+", " ", text).strip().lower()
+    text = _WHITESPACE.sub(" ", text).strip().lower()
 
     # Lemmatize
     doc = _nlp(text)
@@ -71,13 +95,19 @@ def normalize_and_lemmatize(text: str) -> str:
 # EMBEDDING (Qdrant)
 # ==========================================================
 
-def _embed(text: str):
+@functools.lru_cache(maxsize=8192)
+def _embed_cached(text: str) -> tuple:
     resp = session.post(
         f"{settings.OLLAMA_BASE_URL}/api/embeddings",
         json={"model": settings.EMBED_MODEL, "prompt": text}
     )
     resp.raise_for_status()
-    return resp.json()["embedding"]
+    return tuple(resp.json()["embedding"])
+
+
+def _embed(text: str):
+    """Query embedding; repeated strings are served from the LRU, not Ollama."""
+    return list(_embed_cached(text))
 
 
 # ==========================================================
@@ -91,7 +121,10 @@ def bm25_search(query: str, top_k=TOP_K):
         index=settings.ELASTICSEARCH_INDEX,
         size=top_k,
         query={"match": {"text": query_lem}},
-        stored_fields=["doc_id"]
+        # doc_id read from columnar doc values: no _source / stored-field decompression
+        _source=False,
+        docvalue_fields=["doc_id"],
+        track_total_hits=False
     )
 
     results = []
@@ -108,8 +141,8 @@ def bm25_search(query: str, top_k=TOP_K):
 # QDRANT SEARCH
 # ==========================================================
 
-def vector_search(query: str, top_k=TOP_K):
-    vec = _embed(query)
+def vector_search(query: str, top_k=TOP_K, query_vector=None):
+    vec = query_vector if query_vector is not None else _embed(query)
 
     res = qdrant.query_points(
         collection_name=settings.QDRANT_COLLECTION,
@@ -155,6 +188,29 @@ def fetch_chunk(point_id: str):
     }
 
 
+def fetch_chunks(point_ids):
+    """Batch version of fetch_chunk: one Qdrant round-trip, keyed by str(id)."""
+    if not point_ids:
+        return {}
+
+    res = qdrant.retrieve(
+        collection_name=settings.QDRANT_COLLECTION,
+        ids=list(point_ids),
+        with_payload=True,
+        with_vectors=False
+    )
+
+    return {
+        str(pt.id): {
+            "id": pt.id,
+            "chunk_text": pt.payload.get("chunk_text", ""),
+            "hash": pt.payload.get("hash"),
+            "metadata": pt.payload.get("metadata")
+        }
+        for pt in res
+    }
+
+
 # ==========================================================
 # HYBRID RRF FUSION (dynamic top_k)
 # ==========================================================
@@ -163,33 +219,20 @@ def hybrid_re_rank(bm25_res, vec_res, final_k):
     """
     Combine BM25 + vector results using RRF.
     final_k: number of results to return.
+    Both lists arrive already sorted by score (Elasticsearch and Qdrant
+    return hits best-first), so ranks are read straight from their order.
     """
+    bm25_rank = {item["id"]: 1 / (rank + 60) for rank, item in enumerate(bm25_res)}
+    vec_rank = {item["id"]: 1 / (rank + 60) for rank, item in enumerate(vec_res)}
 
-    scores = {}  # {doc_id: {"bm25": float, "vec": float}}
-
-    # --- BM25 scoring ---
-    bm25_sorted = sorted(bm25_res, key=lambda x: -x["score"])
-    for rank, item in enumerate(bm25_sorted):
-        doc_id = item["id"]
-        scores.setdefault(doc_id, {"bm25": 0, "vec": 0})
-        scores[doc_id]["bm25"] = 1 / (rank + 60)
-
-    # --- Vector scoring ---
-    vec_sorted = sorted(vec_res, key=lambda x: -x["score"])
-    for rank, item in enumerate(vec_sorted):
-        doc_id = item["id"]
-        scores.setdefault(doc_id, {"bm25": 0, "vec": 0})
-        scores[doc_id]["vec"] = 1 / (rank + 60)
-
-    # --- Weighted merge ---
-    fused = []
-    for doc_id, s in scores.items():
-        fused_score = BM25_WEIGHT * s["bm25"] + VECTOR_WEIGHT * s["vec"]
-        fused.append((doc_id, fused_score))
+    # --- Weighted merge (BM25 ids first, for a stable order on ties) ---
+    fused = [
+        (doc_id, BM25_WEIGHT * bm25_rank.get(doc_id, 0) + VECTOR_WEIGHT * vec_rank.get(doc_id, 0))
+        for doc_id in {**bm25_rank, **vec_rank}
+    ]
 
     # --- Sort & return final_k ---
-    fused_sorted = sorted(fused, key=lambda x: -x[1])[:final_k]
-    return fused_sorted
+    return sorted(fused, key=lambda x: -x[1])[:final_k]
 
 
 
@@ -197,31 +240,44 @@ def hybrid_re_rank(bm25_res, vec_res, final_k):
 # PUBLIC API — THE ONLY FUNCTION THE USER CALLS
 # ==========================================================
 
-def retrieve(prompt: str, top_k: int = 5):
+def retrieve(prompt: str, top_k: int = 5, query_vector=None):
     """
     Full hybrid pipeline:
     - top_k BM25 candidates
     - top_k vector candidates
     - Fuse and return top_k final results
+
+    query_vector: embedding of prompt when the caller already has it
     """
-    # 1. BM25
-    bm25_results = bm25_search(prompt, top_k)
+    # 1. BM25 (Elasticsearch) in the background
+    bm25_future = _search_pool.submit(bm25_search, prompt, top_k)
 
-    # 2. Vector
-    vector_results = vector_search(prompt, top_k)
+    # 2. Vector (Ollama embed + Qdrant) meanwhile
+    vector_results = vector_search(prompt, top_k, query_vector)
+    bm25_results = bm25_future.result()
 
     # 3. Fusion
     fused = hybrid_re_rank(bm25_results, vector_results, final_k=top_k)
 
-    # 4. Fetch chunks from Qdrant
+    # 4. Chunks: vector hits already carry their payload, only BM25-only
+    #    ids need a (single, batched) Qdrant call
+    chunks = {
+        str(r["id"]): {
+            "id": r["id"],
+            "chunk_text": r["chunk_text"],
+            "hash": r["hash"],
+            "metadata": r["metadata"]
+        }
+        for r in vector_results
+    }
+    chunks.update(fetch_chunks([doc_id for doc_id, _ in fused if str(doc_id) not in chunks]))
+
+    # fused is already best-first, so output is too
     output = []
     for doc_id, fused_score in fused:
-        chunk = fetch_chunk(doc_id)
+        chunk = chunks.get(str(doc_id))
         if chunk:
             chunk["fused_score"] = fused_score
             output.append(chunk)
 
-    # Sort again by fused score just to be clean
-    output = sorted(output, key=lambda x: -x["fused_score"])
-
     return output
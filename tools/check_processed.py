@@ -2,6 +2,7 @@
 """Quick checks for processed/raw Mongo collections.
 
 Usage:
+  pip install -r tools/requirements_process.txt
   python3 tools/check_processed.py
 
 This prints counts, sample documents, and any documents with extraction errors.
@@ -19,7 +20,8 @@ def jprint(obj):
 
 def main():
     uri = os.environ.get("MONGO_URI", "mongodb://localhost:27017")
-    client = MongoClient(uri)
+    # wire compression: zstd when the zstandard package is installed, zlib otherwise
+    client = MongoClient(uri, compressors="zstd,zlib")
     raw_db = os.environ.get("RAW_DB", "btp_rag")
     raw_coll = os.environ.get("RAW_COLLECTION", "raw_files")
     proc_db = os.environ.get("PROCESSED_DB", "btp_rag_processed")
@@ -31,9 +33,10 @@ def main():
     print("Mongo URI:", uri)
     print()
 
+    # collection metadata counts: no full collection scan
     counts = {
-        "raw_count": rc.count_documents({}),
-        "processed_count": pc.count_documents({}),
+        "raw_count": rc.estimated_document_count(),
+        "processed_count": pc.estimated_document_count(),
     }
     jprint(counts)
 
@@ -53,14 +56,16 @@ def main():
         print("(no extract_error docs found)")
 
     print("\nRaw docs without a matching processed doc (limit 20):")
-    missing = []
-    cursor = rc.find({}).limit(1000)
-    for r in cursor:
-        proc_id = f"proc_{r.get('_id')}"
-        if pc.count_documents({"_id": proc_id}) == 0:
-            missing.append({"_id": r.get("_id"), "file_path": r.get("file_path")})
-            if len(missing) >= 20:
-                break
+    # one $in query for the whole sample instead of a count per raw doc
+    # (the collections may live in different databases, so no $lookup)
+    sample_raw = list(rc.find({}, {"file_path": 1}).limit(1000).batch_size(1000))
+    proc_ids = [f"proc_{r.get('_id')}" for r in sample_raw]
+    processed_ids = {d["_id"] for d in pc.find({"_id": {"$in": proc_ids}}, {"_id": 1})}
+    missing = [
+        {"_id": r.get("_id"), "file_path": r.get("file_path")}
+        for r, proc_id in zip(sample_raw, proc_ids)
+        if proc_id not in processed_ids
+    ][:20]
     if missing:
         jprint(missing)
     else:
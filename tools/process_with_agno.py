@@ -4,11 +4,15 @@ Process raw files listed in MongoDB `raw_files` and create processed documents i
 
 Behavior:
 - Connects to MongoDB and iterates over documents in the raw collection.
-- For each file, attempts to extract text (HTML via BeautifulSoup, PDF via pdfminer.six, small text files via reading).
+- For each file, attempts to extract text (HTML via selectolax or BeautifulSoup, PDF via pypdfium2 with pdfminer.six as fallback, small text files via reading).
 - Optionally mark images for OCR (requires external tesseract installation and `pytesseract`).
 - Stores processed document in `processed_db.processed_docs` with fields:
   - `_id`: same as source raw _id prefixed (e.g. `proc_{rawid}`)
   - `source_id`, `file_path`, `mime`, `text`, `images`, `metadata`, `processed_at`
+- Processed documents are upserted with batched, unordered bulk writes.
+- Raw `_id`s are content hashes, so a raw doc whose processed doc already exists
+  (same path, size and mtime, no error) is unchanged and not extracted again
+  (use `--reprocess` to force it).
 
 Usage:
   pip install -r tools/requirements_process.txt
@@ -18,36 +22,79 @@ Usage:
 from __future__ import annotations
 
 import argparse
+import codecs
+import contextlib
+import functools
 import hashlib
+import io
+import itertools
 import mimetypes
+import mmap
+import multiprocessing
 import os
+import re
+import signal
 import sys
+import threading
 import time
-from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
 from typing import Optional
 import logging
 import json
 
 try:
     import requests
+    from requests.adapters import HTTPAdapter
+    from urllib3.util.retry import Retry
 except Exception:
     requests = None
 
 try:
-    from pymongo import MongoClient
+    import orjson
+except Exception:
+    orjson = None
+
+try:
+    from pymongo import MongoClient, UpdateOne
+    from pymongo.errors import BulkWriteError
+    from pymongo.write_concern import WriteConcern
 except Exception:
     print("Missing dependency 'pymongo'. Install with: pip install pymongo")
     raise
 
+try:
+    from selectolax.lexbor import LexborHTMLParser
+except Exception:
+    LexborHTMLParser = None
+
+try:
+    import lxml.html as lxml_html
+except Exception:
+    lxml_html = None
+
 try:
     from bs4 import BeautifulSoup
 except Exception:
     BeautifulSoup = None
 
 try:
-    from pdfminer.high_level import extract_text as extract_text_from_pdf
+    import magic
 except Exception:
-    extract_text_from_pdf = None
+    magic = None
+
+try:
+    import pypdfium2 as pdfium
+except Exception:
+    pdfium = None
+
+try:
+    from pdfminer.converter import TextConverter
+    from pdfminer.layout import LAParams
+    from pdfminer.pdfinterp import PDFPageInterpreter, PDFResourceManager
+    from pdfminer.pdfpage import PDFPage
+except Exception:
+    PDFPage = None
 
 # configure basic logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s %(message)s')
@@ -58,32 +105,203 @@ try:
 except Exception:
     pass
 
+# processed records are upserted in unordered bulk writes of this size
+BULK_BATCH_SIZE = 500
+
+TEXT_EXTENSIONS = {".txt", ".md", ".py", ".json", ".csv"}
+HTML_EXTENSIONS = {".html", ".htm"}
+HTML_MIMES = {"text/html", "application/xhtml+xml"}
+TEXT_MIMES = {"application/json", "application/csv", "application/xml"}
+
+# text files at least this large are decoded straight from a read-only memory map
+MMAP_MIN_SIZE = 4 * 1024 * 1024
+
+# <meta charset="..."> / http-equiv content="...; charset=..." in the head of an HTML file
+_META_CHARSET_RE = re.compile(rb'<meta[^>]+charset\s*=\s*["\']?([\w.:-]+)', re.IGNORECASE)
+
+
+def read_text_file(path: str) -> str:
+    with open(path, "rb") as f:
+        fd = f.fileno()
+        if hasattr(os, "posix_fadvise"):  # not on Windows
+            os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_SEQUENTIAL)
+        if os.fstat(fd).st_size < MMAP_MIN_SIZE:
+            text = f.read().decode("utf-8", "ignore")
+        else:
+            # decode straight from the page cache: no intermediate bytes copy of the file
+            with mmap.mmap(fd, 0, access=mmap.ACCESS_READ) as mm:
+                text = str(mm, "utf-8", "ignore")
+    # same universal newlines as a text-mode read
+    if "\r" in text:
+        text = text.replace("\r\n", "\n").replace("\r", "\n")
+    return text
+
+
+def html_encoding(head: bytes) -> str:
+    # charset declared in the first KiB of the page, utf-8 if absent or unknown
+    match = _META_CHARSET_RE.search(head)
+    if match:
+        try:
+            return codecs.lookup(match.group(1).decode("ascii")).name
+        except (LookupError, UnicodeDecodeError):
+            pass
+    return "utf-8"
+
 
 def extract_text_from_html(path: str) -> Optional[str]:
+    if LexborHTMLParser is None and lxml_html is None and BeautifulSoup is None:
+        return None
+    try:
+        with open(path, "rb") as f:
+            data = f.read()
+        html = data.decode(html_encoding(data[:1024]), errors="replace")
+    except Exception:
+        return None
+    if LexborHTMLParser is not None:
+        try:
+            # C parser (lexbor): an order of magnitude faster than bs4's html.parser
+            tree = LexborHTMLParser(html)
+            # same text as the fallbacks below: no script or style bodies
+            tree.strip_tags(["script", "style"])
+            body = tree.body
+            return body.text(separator="\n", strip=True) if body else None
+        except Exception as e:
+            logging.debug("selectolax parsing failed for %s: %s", path, e)
+    if lxml_html is not None:
+        try:
+            # libxml2 tree in C: same text as bs4's get_text below, without a Python object per node
+            root = lxml_html.document_fromstring(html)
+            for node in list(root.iter("script", "style")):
+                node.drop_tree()
+            return "\n".join(root.itertext())
+        except Exception as e:
+            logging.debug("lxml parsing failed for %s: %s", path, e)
     if BeautifulSoup is None:
         return None
     try:
-        with open(path, "r", encoding="utf-8", errors="ignore") as f:
-            html = f.read()
         soup = BeautifulSoup(html, "html.parser")
-        return soup.get_text(separator="\n")
+        text = soup.get_text(separator="\n")
+        soup.decompose()  # break the tree's reference cycles now rather than at the next GC pass
+        return text
     except Exception:
         return None
 
 
-def extract_text_from_file(path: str) -> Optional[str]:
+def extract_text_from_pdf_pdfium(path: str, max_pages: int = 0) -> str:
+    # native PDFium parser: much faster than pdfminer, notably on graphics-heavy pages
+    pdf = pdfium.PdfDocument(path)
+    try:
+        parts = []
+        for page in itertools.islice(pdf, max_pages or None):
+            textpage = page.get_textpage()
+            parts.append(textpage.get_text_range())
+            textpage.close()
+            page.close()
+        return "\n".join(parts)
+    finally:
+        pdf.close()
+
+
+def extract_text_from_pdf(path: str, max_pages: int = 0) -> str:
+    # pdfminer.high_level.extract_text, page by page: the converter's buffer is drained
+    # after each page instead of accumulating the whole document
+    output = io.StringIO()
+    rsrcmgr = PDFResourceManager(caching=True)
+    device = TextConverter(rsrcmgr, output, laparams=LAParams())
+    interpreter = PDFPageInterpreter(rsrcmgr, device)
+    parts = []
+    try:
+        with open(path, "rb") as fp:
+            for page in PDFPage.get_pages(fp, maxpages=max_pages):
+                interpreter.process_page(page)
+                parts.append(output.getvalue())
+                output.seek(0)
+                output.truncate()
+    finally:
+        device.close()
+    return "".join(parts)
+
+
+_magic = None
+
+
+def sniff_mime(path: str) -> Optional[str]:
+    # libmagic content sniff (reads the file head); one handle per worker process
+    global _magic
+    if magic is None:
+        return None
+    try:
+        if _magic is None:
+            _magic = magic.Magic(mime=True)
+        return _magic.from_file(path)
+    except Exception:
+        return None
+
+
+def file_kind(path: str) -> Optional[str]:
+    """'text', 'html' or 'pdf' from the file content when libmagic knows it, else from the extension."""
     ext = os.path.splitext(path)[1].lower()
+    kind = "text" if ext in TEXT_EXTENSIONS else "html" if ext in HTML_EXTENSIONS else "pdf" if ext == ".pdf" else None
+    mime = sniff_mime(path)
+    if mime is None or mime in {"application/octet-stream", "inode/x-empty"}:
+        return kind
+    if mime == "application/pdf":
+        return "pdf"
+    if mime in HTML_MIMES:
+        return "html"
+    if mime.startswith("text/") or mime in TEXT_MIMES:
+        # small or doctype-less pages are often sniffed as plain text
+        return "html" if kind == "html" else "text"
+    # misnamed binary: never hand it to the (slow to fail) PDF parsers
+    return None if kind == "pdf" else kind
+
+
+class ExtractionTimeout(BaseException):
+    # BaseException: the extractors' broad `except Exception` fallbacks must not swallow it
+    pass
+
+
+def _raise_timeout(signum, frame):
+    raise ExtractionTimeout()
+
+
+@contextlib.contextmanager
+def time_limit(seconds: float):
+    """Interrupt the enclosed (pure-Python) extraction after `seconds` with ExtractionTimeout.
+
+    Uses SIGALRM, so it only applies on POSIX and in the main thread (pool workers run
+    their tasks there); elsewhere, or with seconds=0, the block runs unbounded.
+    """
+    if not seconds or not hasattr(signal, "setitimer") or threading.current_thread() is not threading.main_thread():
+        yield
+        return
+    previous = signal.signal(signal.SIGALRM, _raise_timeout)
+    signal.setitimer(signal.ITIMER_REAL, seconds)
     try:
-        if ext in {".txt", ".md", ".py", ".json", ".csv"}:
-            with open(path, "r", encoding="utf-8", errors="ignore") as f:
-                return f.read()
-        if ext in {".html", ".htm"}:
+        yield
+    finally:
+        signal.setitimer(signal.ITIMER_REAL, 0)
+        signal.signal(signal.SIGALRM, previous)
+
+
+def extract_text_from_file(path: str, pdf_max_pages: int = 0) -> Optional[str]:
+    try:
+        kind = file_kind(path)
+        if kind == "text":
+            return read_text_file(path)
+        if kind == "html":
             return extract_text_from_html(path)
-        if ext == ".pdf":
-            if extract_text_from_pdf is None:
+        if kind == "pdf":
+            if pdfium is not None:
+                try:
+                    return extract_text_from_pdf_pdfium(path, pdf_max_pages)
+                except Exception as e:
+                    # fall back to pdfminer below
+                    logging.debug("pypdfium2 extraction failed for %s: %s", path, e)
+            if PDFPage is None:
                 return None
             try:
-                return extract_text_from_pdf(path)
+                return extract_text_from_pdf(path, pdf_max_pages)
             except Exception as e:
                 # Log the PDF extraction error and return None so processing continues
                 logging.warning("PDF extraction failed for %s: %s", path, e)
@@ -93,6 +311,30 @@ def extract_text_from_file(path: str) -> Optional[str]:
     return None
 
 
+# Agno payloads and (possibly large markdown) responses go through orjson when installed
+_json_dumps = orjson.dumps if orjson is not None else (lambda obj: json.dumps(obj).encode())
+_json_loads = orjson.loads if orjson is not None else json.loads
+_JSON_HEADERS = {"Content-Type": "application/json"}
+
+_agno_session = None
+
+
+def get_agno_session():
+    # one keep-alive session per (worker) process, created on first use so it is
+    # never shared across a fork; each worker sends one request at a time
+    global _agno_session
+    if _agno_session is None:
+        _agno_session = requests.Session()
+        adapter = HTTPAdapter(
+            pool_connections=1,
+            pool_maxsize=1,
+            max_retries=Retry(total=3, backoff_factor=0.3, status_forcelist=[502, 503, 504], allowed_methods=frozenset({"POST"})),
+        )
+        _agno_session.mount("https://", adapter)
+        _agno_session.mount("http://", adapter)
+    return _agno_session
+
+
 def call_agno(agno_endpoint: str, file_url: Optional[str], file_path: str) -> Optional[dict]:
     logging.debug("Calling Agno HTTP endpoint %s for %s (file_url=%s)", agno_endpoint, file_path, file_url)
     if requests is None:
@@ -102,10 +344,10 @@ def call_agno(agno_endpoint: str, file_url: Optional[str], file_path: str) -> Op
         payload = {"file_path": file_path}
         if file_url:
             payload["file_url"] = file_url
-        resp = requests.post(agno_endpoint, json=payload, timeout=60)
+        resp = get_agno_session().post(agno_endpoint, data=_json_dumps(payload), headers=_JSON_HEADERS, timeout=60)
         if resp.status_code == 200:
             try:
-                return resp.json()
+                return _json_loads(resp.content)
             except Exception:
                 return None
         return None
@@ -148,7 +390,22 @@ def call_agno_py(root_folder: str, rel_path: str) -> Optional[dict]:
     return None
 
 
-def process_one(raw_doc: dict, root_folder: str, ocr: bool = False, agno_endpoint: Optional[str] = None, fileserver_base: Optional[str] = None) -> dict:
+def file_mtime(stat) -> datetime:
+    # BSON dates have millisecond precision: truncate so fingerprints compare equal
+    mtime = datetime.fromtimestamp(stat.st_mtime, timezone.utc)
+    return mtime.replace(microsecond=mtime.microsecond // 1000 * 1000)
+
+
+def file_fingerprint(path: str) -> Optional[tuple]:
+    """(size, mtime) of the file on disk, None if it is missing."""
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return stat.st_size, file_mtime(stat)
+
+
+def process_one(raw_doc: dict, root_folder: str, ocr: bool = False, agno_endpoint: Optional[str] = None, fileserver_base: Optional[str] = None, agno_py: bool = False, pdf_max_pages: int = 0, extract_timeout: float = 0) -> dict:
     rel = raw_doc.get("file_path")
     full = os.path.join(root_folder, rel)
     mime = raw_doc.get("mime") or mimetypes.guess_type(rel)[0] or "application/octet-stream"
@@ -158,19 +415,23 @@ def process_one(raw_doc: dict, root_folder: str, ocr: bool = False, agno_endpoin
         "file_path": rel,
         "mime": mime,
         "metadata": {},
-        "processed_at": datetime.utcnow(),
     }
+    fingerprint = file_fingerprint(full)
+    if fingerprint is not None:
+        processed["file_size"], processed["file_mtime"] = fingerprint
 
     text = None
     images = []
 
     # If AGNO endpoint provided, try it first
-    file_url = None
-    if fileserver_base:
-        file_url = fileserver_base.rstrip('/') + '/' + rel.replace(os.path.sep, '/')
-
-    if agno_endpoint:
-        agno_res = call_agno(agno_endpoint, file_url, rel)
+    if agno_endpoint or agno_py:
+        agno_res = call_agno_py(root_folder, rel) if agno_py else None
+        if not agno_res and agno_endpoint:
+            # only the HTTP call needs the URL; fileserver_base arrives without its trailing slash
+            file_url = None
+            if fileserver_base:
+                file_url = fileserver_base + '/' + (rel if os.path.sep == '/' else rel.replace(os.path.sep, '/'))
+            agno_res = call_agno(agno_endpoint, file_url, rel)
         if agno_res:
             # prefer agno result fields
             if isinstance(agno_res, dict):
@@ -184,9 +445,14 @@ def process_one(raw_doc: dict, root_folder: str, ocr: bool = False, agno_endpoin
                 processed['metadata'].update(agno_res.get('metadata', {}))
                 return processed
 
-    if os.path.exists(full):
+    if fingerprint is not None:
         try:
-            text = extract_text_from_file(full)
+            with time_limit(extract_timeout):
+                text = extract_text_from_file(full, pdf_max_pages)
+        except ExtractionTimeout:
+            logging.warning("Extraction timed out after %ss for %s", extract_timeout, full)
+            processed['extract_error'] = "timeout"
+            text = None
         except Exception as e:
             logging.exception("Unexpected error extracting text from %s: %s", full, e)
             processed['extract_error'] = str(e)
@@ -218,6 +484,11 @@ def process_one(raw_doc: dict, root_folder: str, ocr: bool = False, agno_endpoin
     return processed
 
 
+def _init_worker(log_level: int) -> None:
+    # worker processes may be spawned fresh: carry over --verbose
+    logging.getLogger().setLevel(log_level)
+
+
 def main():
     p = argparse.ArgumentParser()
     p.add_argument("--mongo-uri", default=os.environ.get("MONGO_URI", "mongodb://localhost:27017"))
@@ -231,53 +502,118 @@ def main():
     p.add_argument("--fileserver-base", default=os.environ.get("FILESERVER_BASE_URL", None), help="Optional base URL where raw files are served (for Agno)")
     p.add_argument("--agno-endpoint", default=os.environ.get("AGNO_ENDPOINT", None), help="Optional Agno HTTP endpoint to process files (preferred)")
     p.add_argument("--use-agno-py", action="store_true", help="If installed, use Agno Python API (tries agno.process_file/process/run)")
+    p.add_argument("--pdf-max-pages", type=int, default=0, help="Extract at most this many pages per PDF (default 0: all pages)")
+    p.add_argument("--extract-timeout", type=float, default=60, help="Give up extracting a file after this many seconds (default 60, 0: no limit; POSIX only)")
+    p.add_argument("--reprocess", action="store_true", help="Extract every file, even those already processed without error")
+    p.add_argument("--workers", type=int, default=max((os.cpu_count() or 1) - 1, 1), help="Extraction worker processes (default: CPU count - 1)")
     p.add_argument("--verbose", action="store_true", help="Enable verbose debug logging")
     args = p.parse_args()
 
     if args.verbose:
         logging.getLogger().setLevel(logging.DEBUG)
 
-    client = MongoClient(args.mongo_uri)
+    # timezone-aware datetimes both ways, so stored file_mtime values compare equal to fresh ones
+    client = MongoClient(args.mongo_uri, tz_aware=True)
     raw_coll = client[args.raw_db][args.raw_collection]
-    proc_coll = client[args.processed_db][args.processed_collection]
+    # processed docs are derived data: acknowledged writes without waiting on the journal.
+    # If the server crashes mid-run, rerun the script; the upserts are idempotent.
+    proc_db = client.get_database(args.processed_db, write_concern=WriteConcern(w=1, j=False))
+    proc_coll = proc_db[args.processed_collection]
+    # upserts and the skip check go through _id; these back lookups by raw doc or path
+    # (create_index is a no-op when the index already exists)
+    proc_coll.create_index("source_id")
+    proc_coll.create_index("file_path")
 
     query = {}
-    cursor = raw_coll.find(query)
+    # only the fields process_one reads; large batches, and no idle timeout while
+    # the workers are busy on a batch (the cursor is closed explicitly below)
+    cursor = raw_coll.find(query, {"file_path": 1, "mime": 1}, no_cursor_timeout=True).batch_size(1000)
+    if args.limit:
+        cursor = cursor.limit(args.limit)
     total = 0
     inserted = 0
     updated = 0
+    skipped = 0
+    ops = []
 
-    for doc in cursor:
-        total += 1
-        processed = process_one(
-            doc,
-            args.root,
-            ocr=args.ocr,
-            agno_endpoint=args.agno_endpoint,
-            fileserver_base=args.fileserver_base,
-            # pass flag to try agno python API first
-            agno_py=args.use_agno_py,
-        )
-        proc_id = f"proc_{doc.get('_id')}"
-        processed_record = {"_id": proc_id, **processed}
-        # idempotent upsert
-        existing = proc_coll.find_one({"_id": proc_id})
-        if existing:
-            # preserve first_scraped_at if present
-            if 'first_scraped_at' in existing:
-                processed_record['first_scraped_at'] = existing['first_scraped_at']
-            proc_coll.update_one({"_id": proc_id}, {"$set": processed_record})
-            updated += 1
-        else:
-            # set first_scraped_at to now
-            processed_record['first_scraped_at'] = datetime.utcnow()
-            proc_coll.insert_one(processed_record)
-            inserted += 1
-
-        if args.limit and total >= args.limit:
-            break
+    def flush():
+        nonlocal inserted, updated
+        if not ops:
+            return
+        try:
+            result = proc_coll.bulk_write(ops, ordered=False)
+            inserted += result.upserted_count
+            updated += result.matched_count
+        except BulkWriteError as e:
+            details = e.details
+            inserted += details.get("nUpserted", 0)
+            updated += details.get("nMatched", 0)
+            for err in details.get("writeErrors", []):
+                logging.warning("Error upserting %s: %s", err.get("op", {}).get("q"), err.get("errmsg"))
+        ops.clear()
+
+    process = functools.partial(
+        process_one,
+        root_folder=args.root,
+        ocr=args.ocr,
+        agno_endpoint=args.agno_endpoint,
+        # stripped once here rather than for every doc
+        fileserver_base=args.fileserver_base.rstrip('/') if args.fileserver_base else None,
+        # pass flag to try agno python API first
+        agno_py=args.use_agno_py,
+        pdf_max_pages=args.pdf_max_pages,
+        extract_timeout=args.extract_timeout,
+    )
 
-    print({"total": total, "inserted": inserted, "updated": updated})
+    try:
+        # extraction (pdfminer, BeautifulSoup) is CPU-bound: run it in worker processes.
+        # Raw docs are fed one bulk batch at a time so the in-flight set stays bounded;
+        # Mongo reads and writes stay in this process, which owns the only MongoClient:
+        # workers start from a clean forkserver (POSIX) instead of forking a process whose
+        # client already holds sockets and monitor threads (pymongo is not fork-safe).
+        mp_context = multiprocessing.get_context("forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else None)
+        with ProcessPoolExecutor(max_workers=args.workers, mp_context=mp_context, initializer=_init_worker, initargs=(logging.getLogger().level,)) as pool:
+            while True:
+                batch = list(itertools.islice(cursor, BULK_BATCH_SIZE))
+                if not batch:
+                    break
+                total += len(batch)
+                if not args.reprocess:
+                    # raw _id is the file's SHA256 at ingest time: an error-free processed doc for it
+                    # is up to date unless the file on disk changed since (size or mtime differ)
+                    proc_ids = [f"proc_{doc.get('_id')}" for doc in batch]
+                    done = {
+                        d["_id"]: (d.get("file_path"), d.get("file_size"), d.get("file_mtime"))
+                        for d in proc_coll.find(
+                            {"_id": {"$in": proc_ids}, "error": {"$exists": False}, "extract_error": {"$exists": False}},
+                            {"_id": 1, "file_path": 1, "file_size": 1, "file_mtime": 1},
+                        ).batch_size(BULK_BATCH_SIZE)  # whole answer in one reply (default first batch is 101)
+                    }
+                    todo = []
+                    for doc, proc_id in zip(batch, proc_ids):
+                        stored = done.get(proc_id)
+                        rel = doc.get("file_path")
+                        if stored is None or stored[0] != rel or stored[1:] != file_fingerprint(os.path.join(args.root, rel)):
+                            todo.append(doc)
+                    skipped += len(batch) - len(todo)
+                    batch = todo
+                # one timestamp per batch, stamped here rather than in each worker
+                now = datetime.now(timezone.utc)
+                for processed in pool.map(process, batch, chunksize=16):
+                    proc_id = f"proc_{processed['source_id']}"
+                    processed["processed_at"] = now
+                    # idempotent upsert; first_scraped_at is only set when the record is created
+                    update = {"$set": processed, "$setOnInsert": {"first_scraped_at": now}}
+                    # clear errors left by a previous run so the doc is not retried forever
+                    stale_errors = {field: "" for field in ("error", "extract_error") if field not in processed}
+                    if stale_errors:
+                        update["$unset"] = stale_errors
+                    ops.append(UpdateOne({"_id": proc_id}, update, upsert=True))
+                flush()
+    finally:
+        cursor.close()
+
+    print({"total": total, "inserted": inserted, "updated": updated, "skipped": skipped})
 
 
 if __name__ == "__main__":